@@ -1,9 +1,14 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import matplotlib.pyplot as plt
 from wordcloud import WordCloud
 
+import data_loader
+import figures
+import profiling
+from token_index import token_frequencies
+from time_index import HOUR, from_epoch, to_epoch
+
 def render():
 
     st.title("🌟 Behavior-News Analysis Dashboard")
@@ -14,18 +19,32 @@ def render():
     )
 
     
-    behaviors = pd.read_csv("data/behaviors.csv")
-    news = pd.read_csv("data/news.csv")
+    news = data_loader.load_table("news", ["Category", "SubCategory", "Title"])
 
 
+    profiling.section("User Click History")
     st.header("📊 User Click History")
-    user_clicks = behaviors["History"].str.split(" ", expand=True).stack().value_counts()
-    fig1, ax1 = plt.subplots(figsize=(12, 6))
-    ax1.bar(user_clicks.index[:20], user_clicks.values[:20], color="skyblue")
-    ax1.set_xticklabels(user_clicks.index[:20], rotation=45, ha="right")
-    ax1.set_title("Top 20 Clicked Articles")
-    ax1.set_ylabel("Click Count")
-    st.pyplot(fig1)
+    # Aggregates come from the report.py bundle when it is current.
+    click_counts = data_loader.report_table("click_counts")
+    if click_counts is not None:
+        user_clicks = click_counts["Users"]
+        history_summary = data_loader.report_table("click_counts", "history_lengths")
+    else:
+        history = data_loader.history_index()
+        user_clicks = history.popularity()
+        history_summary = history.history_lengths().describe().to_frame().T
+    top_clicks = user_clicks.head(20)
+
+    def draw_top_clicks(fig):
+        ax1 = fig.subplots()
+        ax1.bar(top_clicks.index, top_clicks.values, color="skyblue")
+        ax1.set_xticks(range(len(top_clicks)), top_clicks.index, rotation=45, ha="right")
+        ax1.set_title("Top 20 Clicked Articles")
+        ax1.set_ylabel("Users Who Clicked")
+
+    figures.show(("top_clicks", figures.data_version(top_clicks)), draw_top_clicks, figsize=(12, 6))
+    st.write("**History length per user:**")
+    st.dataframe(history_summary)
     st.write(
         "**Importance:**\n"
         "Analyzing user click history helps uncover the most popular news articles among users. "
@@ -34,9 +53,30 @@ def render():
     )
 
     
+    profiling.section("Users Who Clicked This Also Clicked")
+    st.header("🔗 Users Who Clicked This Also Clicked")
+    coclicks = data_loader.coclick_index()
+    article_id = st.text_input("News ID:", user_clicks.index[0] if len(user_clicks) else "").strip()
+    if article_id:
+        try:
+            neighbours = coclicks.neighbours(article_id, k=10)
+            news_details = data_loader.load_table("news", ["News ID", "Category", "SubCategory", "Title"])
+            st.dataframe(neighbours.merge(news_details, on="News ID", how="left"), hide_index=True)
+        except KeyError:
+            st.error(f"No click history found for {article_id}.")
+    st.write(
+        "**Importance:**\n"
+        "Articles that are clicked by the same users are natural candidates for item-to-item recommendation, "
+        "and their categories show which topics readers combine."
+    )
+
+    
+    profiling.section("News Categories")
     st.header("🗂️ News Categories")
-    category_counts = news["Category"].value_counts().reset_index()
-    category_counts.columns = ["Category", "Count"]
+    category_counts = data_loader.report_table("category_counts")
+    if category_counts is None:
+        category_counts = news["Category"].value_counts().reset_index()
+        category_counts.columns = ["Category", "Count"]
     fig2 = px.pie(
         category_counts,
         names="Category",
@@ -44,7 +84,8 @@ def render():
         title="Distribution of News Categories",
         hole=0.4,
     )
-    st.plotly_chart(fig2, use_container_width=True)
+    with profiling.span("st.plotly_chart", "render"):
+        st.plotly_chart(fig2, use_container_width=True)
     st.write(
         "**Importance:**\n"
         "Understanding the distribution of news categories allows platforms to balance the variety of content available. "
@@ -55,14 +96,23 @@ def render():
 
 
     
+    profiling.section("Top Subcategories")
     st.header("📂 Top Subcategories")
-    subcategory_counts = news["SubCategory"].value_counts().head(10)
-    fig3, ax3 = plt.subplots(figsize=(8, 4))
-    ax3.bar(subcategory_counts.index, subcategory_counts.values, color="salmon")
-    ax3.set_xticklabels(subcategory_counts.index, rotation=45, ha="right")
-    ax3.set_title("Top 10 News Subcategories")
-    ax3.set_ylabel("Count")
-    st.pyplot(fig3)
+    subcategory_counts = data_loader.report_table("category_counts", "subcategory_counts")
+    if subcategory_counts is None:
+        subcategory_counts = news["SubCategory"].value_counts()
+    else:
+        subcategory_counts = subcategory_counts["Count"]
+    subcategory_counts = subcategory_counts.head(10)
+
+    def draw_subcategories(fig):
+        ax3 = fig.subplots()
+        ax3.bar(subcategory_counts.index, subcategory_counts.values, color="salmon")
+        ax3.set_xticks(range(len(subcategory_counts)), subcategory_counts.index, rotation=45, ha="right")
+        ax3.set_title("Top 10 News Subcategories")
+        ax3.set_ylabel("Count")
+
+    figures.show(("subcategories", figures.data_version(subcategory_counts)), draw_subcategories, figsize=(8, 4))
     st.write(
         "**Importance:**\n"
         "Diving into subcategories allows for a more granular understanding of user interests. "
@@ -71,9 +121,62 @@ def render():
     )
 
 
+    profiling.section("Click-Through Rates")
+    st.header("🖱️ Click-Through Rates")
+    ctr = data_loader.ctr_aggregates()
+    min_impressions = st.slider("Minimum impressions per article:", 1, 500, 20)
+    top_ctr = ctr.per_news(min_impressions).nlargest(20, "CTR")
+    st.dataframe(top_ctr, hide_index=True)
+
+    category_ctr = ctr.per_group(news, "Category")
+    st.bar_chart(category_ctr["CTR"])
+    st.dataframe(ctr.per_group(news, "SubCategory").head(20))
+
+    st.subheader("CTR by Position in the Impression List")
+    st.line_chart(ctr.per_position()["CTR"].head(50))
+    st.write("**Impressions per user:**")
+    st.dataframe(ctr.per_user().describe().T)
+    st.write(
+        "**Importance:**\n"
+        "Click-through rate measures how often an article is clicked when it is shown. "
+        "Comparing it across categories and list positions separates genuinely engaging content "
+        "from articles that are simply shown more often or higher up the list."
+    )
+
+
+    profiling.section("Activity Over Time")
+    st.header("⏱️ Activity Over Time")
+    hourly = data_loader.load_table("behaviors_hourly")
+    if len(hourly):
+        first_hour, last_hour = from_epoch(hourly["Hour"].min()), from_epoch(hourly["Hour"].max() + HOUR)
+        time_range = st.slider(
+            "Time range:",
+            min_value=first_hour.to_pydatetime(),
+            max_value=last_hour.to_pydatetime(),
+            value=(first_hour.to_pydatetime(), min(first_hour + pd.Timedelta(days=1), last_hour).to_pydatetime()),
+            step=pd.Timedelta(hours=1).to_pytimedelta(),
+            format="MM/DD HH:mm",
+        )
+        start, end = to_epoch(time_range[0]), to_epoch(time_range[1])
+        in_range = hourly[(hourly["Hour"] >= start) & (hourly["Hour"] < end)]
+        st.line_chart(in_range.set_index(from_epoch(in_range["Hour"]))[["Sessions", "Users", "Clicks"]])
+
+        summary, top_clicked = data_loader.range_summary(start, end)
+        st.dataframe(pd.DataFrame([summary]), hide_index=True)
+        st.write("**Most clicked articles in this range:**")
+        st.bar_chart(top_clicked)
+    st.write(
+        "**Importance:**\n"
+        "User activity follows daily and weekly cycles. Knowing when users are active, and what they click "
+        "at those times, helps schedule content and evaluate recommendations on the right time window."
+    )
+
+
+    profiling.section("Length of News Titles")
     st.header("✍️ Length of News Titles")
-    news["Title Length"] = news["Title"].str.len()
-    title_length_distribution = news["Title Length"].value_counts().sort_index()
+    title_length_distribution = data_loader.report_table("title_lengths")
+    if title_length_distribution is None:
+        title_length_distribution = news["Title"].str.len().value_counts().sort_index()
     st.line_chart(title_length_distribution)
     st.write(
         "**Importance:**\n"
@@ -85,26 +188,48 @@ def render():
     st.write("🎉 This dashboard is a comprehensive tool for understanding user behavior and news content trends. By leveraging these insights, platforms can improve their recommendation systems, optimize user engagement, and drive higher satisfaction rates. 🚀")
 
 
+    profiling.section("Word Cloud: Titles and Abstracts")
     st.header("☁️ Word Cloud: Titles and Abstracts")
     st.write("Explore the most frequent words in the news titles and abstracts! 🎨")
 
     
-    title_text = " ".join(news["Title"].dropna())
-    abstract_text = " ".join(news["Abstract"].dropna())
-
+    token_counts = data_loader.load_table("token_counts")
+    selected_categories = st.multiselect(
+        "Filter word clouds by category:", sorted(token_counts["Category"].cat.categories)
+    )
+    subcategory_options = token_counts["SubCategory"]
+    if selected_categories:
+        subcategory_options = subcategory_options[token_counts["Category"].isin(selected_categories)]
+    selected_subcategories = st.multiselect(
+        "Filter word clouds by subcategory:", sorted(subcategory_options.unique())
+    )
 
-    title_wordcloud = WordCloud(width=800, height=400, background_color="white").generate(title_text)
-    abstract_wordcloud = WordCloud(width=800, height=400, background_color="white").generate(abstract_text)
+    word_frequencies = data_loader.report_table("word_frequencies")
+    if word_frequencies is not None and not selected_categories and not selected_subcategories:
+        title_frequencies, abstract_frequencies = (
+            dict(word_frequencies.loc[word_frequencies["Field"] == field, ["Token", "Count"]].to_numpy())
+            for field in ["Title", "Abstract"]
+        )
+    else:
+        title_frequencies = token_frequencies(token_counts, "Title", selected_categories, selected_subcategories)
+        abstract_frequencies = token_frequencies(token_counts, "Abstract", selected_categories, selected_subcategories)
+    if not title_frequencies or not abstract_frequencies:
+        st.write("No words found for the selected filters.")
+        return
+
+    def word_cloud(frequencies):
+        # Layout runs inside draw, so a cached image skips WordCloud as well.
+        def draw(fig):
+            with profiling.span("wordcloud layout"):
+                cloud = WordCloud(width=800, height=400, background_color="white").generate_from_frequencies(frequencies)
+            ax = fig.subplots()
+            ax.imshow(cloud, interpolation="bilinear")
+            ax.axis("off")
+        return draw
 
 
     st.subheader("🔤 Word Cloud for Titles")
-    fig4, ax4 = plt.subplots(figsize=(12, 6))
-    ax4.imshow(title_wordcloud, interpolation="bilinear")
-    ax4.axis("off")
-    st.pyplot(fig4)
+    figures.show(("wordcloud", figures.data_version(title_frequencies)), word_cloud(title_frequencies), figsize=(12, 6))
 
     st.subheader("📖 Word Cloud for Abstracts")
-    fig5, ax5 = plt.subplots(figsize=(8, 4))
-    ax5.imshow(abstract_wordcloud, interpolation="bilinear")
-    ax5.axis("off")
-    st.pyplot(fig5)
\ No newline at end of file
+    figures.show(("wordcloud", figures.data_version(abstract_frequencies)), word_cloud(abstract_frequencies), figsize=(8, 4))
\ No newline at end of file
@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+
+from startup_report import PAGE_MODULES, REPO_DIR
+from synthetic_mind import SCALES, generate
+
+BENCH_DIR = os.path.join(REPO_DIR, "bench")
+HISTORY_FILE = os.path.join(BENCH_DIR, "history.json")
+CASES = ["preprocess"] + [f"render:{page}" for page in PAGE_MODULES]
+
+
+def peak_rss_mb():
+    # Peak resident set of this process and of any pool workers it waited on.
+    try:
+        import resource
+    except ImportError:
+        import psutil
+
+        return {"self": round(psutil.Process().memory_info().peak_wset / 2**20, 1), "children": None}
+    unit = 2**20 if sys.platform == "darwin" else 2**10
+    return {"self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit, 1),
+            "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit, 1)}
+
+
+def bench_preprocess():
+    # Conversions run one at a time so each gets its own timing; the derived
+    # indexes are then built exactly as preprocess.py builds them.
+    from preprocess import DATASETS, DATA_DIR, DERIVED, RAW_DIR, _convert, build_derived, file_checksum, save_manifest
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    manifest, stages = {}, {}
+    for name, spec in DATASETS.items():
+        source_file = os.path.join(RAW_DIR, spec["source"])
+        start = time.perf_counter()
+        manifest[name] = _convert(name, source_file, file_checksum(source_file))[1]
+        stages[f"convert:{name}"] = time.perf_counter() - start
+    save_manifest(manifest)
+    manifest = build_derived(manifest, force=True)
+    for name in DERIVED:
+        if "seconds" in manifest.get(name, {}):
+            stages[f"derived:{name}"] = manifest[name]["seconds"]
+    return stages
+
+
+def bench_render(page):
+    # Everything that hands a finished chart to Streamlit counts as plotting;
+    # the rest of render() is data loading and computation.
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    import figures
+
+    plotting = {"seconds": 0.0}
+
+    def timed(function):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                plotting["seconds"] += time.perf_counter() - start
+        return wrapper
+
+    # Word-cloud layout happens inside render_figure, so it counts as plotting.
+    figures.render_figure, st.plotly_chart = timed(figures.render_figure), timed(st.plotly_chart)
+    start = time.perf_counter()
+    app = AppTest.from_string(f"import {page}\n{page}.render()", default_timeout=3600).run()
+    total = time.perf_counter() - start
+    if app.exception:
+        raise RuntimeError(f"{page}.render() failed: {app.exception[0].value}")
+    return {"compute": total - plotting["seconds"], "plotting": plotting["seconds"]}
+
+
+def run_case_here(case):
+    start = time.perf_counter()
+    stages = bench_preprocess() if case == "preprocess" else bench_render(case.split(":", 1)[1])
+    return {"seconds": time.perf_counter() - start, "stages": {name: round(s, 3) for name, s in stages.items()},
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def run_case(case, raw_dir, data_dir):
+    # Each case runs in a fresh interpreter so peak RSS and the Streamlit
+    # caches start from nothing.
+    env = dict(os.environ, MIND_RAW_DIR=raw_dir, MIND_DATA_DIR=data_dir)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-case", case],
+                            cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"{case} failed:\n{result.stderr[-2000:]}")
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    measured["seconds"] = round(measured["seconds"], 3)
+    return {"wall_seconds": round(wall, 3), **measured}
+
+
+def prepare_workspace(scale, seed):
+    workspace = os.path.join(BENCH_DIR, f"{scale}-seed{seed}")
+    raw_dir, data_dir = os.path.join(workspace, "raw"), os.path.join(workspace, "data")
+    marker = os.path.join(raw_dir, "synthetic.json")
+    if not os.path.exists(marker):
+        start = time.perf_counter()
+        generate(raw_dir, scale, seed)
+        print(f"generated {scale} data in {time.perf_counter() - start:.1f}s")
+    return raw_dir, data_dir
+
+
+def git_revision():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def load_history(path=HISTORY_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_history(history, path=HISTORY_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def run_benchmarks(scale, seed=0, cases=None, history_file=HISTORY_FILE):
+    raw_dir, data_dir = prepare_workspace(scale, seed)
+    if "preprocess" not in (cases or CASES) and not os.path.exists(os.path.join(data_dir, "manifest.json")):
+        raise SystemExit("no preprocessed data for this scale yet; include the preprocess case")
+    # Renders are measured cold: no fitted PCA, statistics or report bundle.
+    for cached in ["cache", "report"]:
+        shutil.rmtree(os.path.join(data_dir, cached), ignore_errors=True)
+
+    history = load_history(history_file)
+    previous = next((entry for entry in reversed(history)
+                     if entry["scale"] == scale and entry["seed"] == seed), None)
+    entry = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": git_revision(),
+             "python": sys.version.split()[0], "scale": scale, "seed": seed, "cases": {}}
+    for case in cases or CASES:
+        entry["cases"][case] = result = run_case(case, raw_dir, data_dir)
+        line = f"{case:<36} {result['seconds']:8.2f}s  peak {result['peak_rss_mb']['self']:8.1f} MB"
+        before = previous and previous["cases"].get(case)
+        if before:
+            line += f"  ({(result['seconds'] / max(before['seconds'], 1e-9) - 1) * 100:+.1f}% vs {previous['revision']})"
+        print(line)
+        for stage, seconds in result["stages"].items():
+            print(f"    {stage:<32} {seconds:8.2f}s")
+    history.append(entry)
+    save_history(history, history_file)
+    return entry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time preprocessing and page computation on synthetic MIND data.")
+    parser.add_argument("--scale", choices=list(SCALES), default="tiny")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cases", nargs="+", choices=CASES, help="only run these cases")
+    parser.add_argument("--history", default=HISTORY_FILE, help="JSON file the results are appended to")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.run_case:
+        print(json.dumps(run_case_here(args.run_case)))
+        return 0
+    run_benchmarks(args.scale, args.seed, args.cases, args.history)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
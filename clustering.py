@@ -0,0 +1,156 @@
+import os
+import glob
+
+import numpy as np
+import pandas as pd
+
+from projection import CACHE_DIR, iter_chunks
+
+DEFAULT_CLUSTERS = 20
+CHUNK_ROWS = 65536
+EPOCHS = 10
+
+
+def cache_paths(store, n_clusters, cache_dir=CACHE_DIR):
+    base = os.path.join(cache_dir, f"kmeans_{store.name}_{store.version[:16]}_{n_clusters}")
+    return {"model": base + ".npz", "labels": base + "_labels.npy", "distances": base + "_distances.npy"}
+
+
+def cached_sizes(store, cache_dirs=(CACHE_DIR,)):
+    # Cluster counts already fitted for this version of the store.
+    sizes = set()
+    for cache_dir in cache_dirs:
+        prefix = os.path.join(cache_dir, f"kmeans_{store.name}_{store.version[:16]}_")
+        for path in glob.glob(prefix + "*.npz"):
+            suffix = path[len(prefix):-len(".npz")]
+            if suffix.isdigit() and os.path.exists(cache_paths(store, int(suffix), cache_dir)["labels"]):
+                sizes.add((int(suffix), cache_dir))
+    return sorted(sizes)
+
+
+class Clusters:
+    def __init__(self, paths):
+        with np.load(paths["model"]) as model:
+            self.centroids = model["centroids"]
+            self.sizes = model["sizes"]
+            self.distance_stats = {key: model[key] for key in ["mean_distance", "std_distance", "max_distance"]}
+            self.inertia = float(model["inertia"])
+            self.warm_start = int(model["warm_start"])
+        self.labels = np.load(paths["labels"], mmap_mode="r")
+        self.distances = np.load(paths["distances"], mmap_mode="r")
+
+    @property
+    def n_clusters(self):
+        return len(self.centroids)
+
+    def summary(self):
+        return pd.DataFrame({
+            "Size": self.sizes,
+            "Mean Distance": self.distance_stats["mean_distance"],
+            "Distance Std": self.distance_stats["std_distance"],
+            "Max Distance": self.distance_stats["max_distance"],
+        }, index=pd.RangeIndex(self.n_clusters, name="Cluster"))
+
+    def members(self, cluster, limit=None):
+        # Rows of the cluster, closest to its centroid first.
+        rows = np.flatnonzero(np.asarray(self.labels) == cluster)
+        rows = rows[np.argsort(self.distances[rows], kind="stable")]
+        return rows[:limit]
+
+
+def warm_start_centroids(store, n_clusters, cache_dirs=(CACHE_DIR,)):
+    # Initial centroids from the cached fit whose size is closest to
+    # n_clusters: its largest clusters when shrinking, or all of its centroids
+    # plus the rows farthest from theirs when growing.
+    fitted = cached_sizes(store, cache_dirs)
+    if not fitted:
+        return None, 0
+    size, cache_dir = min(fitted, key=lambda item: (abs(item[0] - n_clusters), item[0]))
+    previous = Clusters(cache_paths(store, size, cache_dir))
+    if size >= n_clusters:
+        keep = np.sort(np.argsort(-previous.sizes, kind="stable")[:n_clusters])
+        return previous.centroids[keep], size
+    far = np.argsort(-np.asarray(previous.distances), kind="stable")[:n_clusters - size]
+    return np.vstack([previous.centroids, np.asarray(store.vectors[np.sort(far)], dtype=np.float32)]), size
+
+
+def fit_clusters(store, n_clusters=DEFAULT_CLUSTERS, chunk_rows=CHUNK_ROWS, epochs=EPOCHS, seed=0,
+                 cache_dir=CACHE_DIR, cache_dirs=None):
+    from sklearn.cluster import MiniBatchKMeans
+
+    vectors = store.vectors
+    n_clusters = min(n_clusters, len(vectors))
+    paths = cache_paths(store, n_clusters, cache_dir)
+    init, warm_start = warm_start_centroids(store, n_clusters, cache_dirs or (cache_dir,))
+    # Each chunk of float32 rows is one mini-batch; chunks are visited in a
+    # new random order every epoch.
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, init="k-means++" if init is None else init, n_init=1,
+                             random_state=seed)
+    chunks = list(iter_chunks(len(vectors), chunk_rows, n_clusters))
+    rng = np.random.default_rng(seed)
+    for _ in range(epochs):
+        for i in rng.permutation(len(chunks)):
+            start, stop = chunks[i]
+            kmeans.partial_fit(np.asarray(vectors[start:stop], dtype=np.float32))
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_labels, tmp_distances = paths["labels"] + ".tmp", paths["distances"] + ".tmp"
+    labels = np.lib.format.open_memmap(tmp_labels, mode="w+", dtype=np.int32, shape=(len(vectors),))
+    distances = np.lib.format.open_memmap(tmp_distances, mode="w+", dtype=np.float32, shape=(len(vectors),))
+    total = np.zeros(n_clusters)
+    total_sq = np.zeros(n_clusters)
+    highest = np.zeros(n_clusters)
+    for start, stop in iter_chunks(len(vectors), chunk_rows):
+        to_centroids = kmeans.transform(np.asarray(vectors[start:stop], dtype=np.float32))
+        chunk_labels = np.argmin(to_centroids, axis=1)
+        chunk_distances = to_centroids[np.arange(len(chunk_labels)), chunk_labels]
+        labels[start:stop], distances[start:stop] = chunk_labels, chunk_distances
+        total += np.bincount(chunk_labels, weights=chunk_distances, minlength=n_clusters)
+        total_sq += np.bincount(chunk_labels, weights=np.square(chunk_distances), minlength=n_clusters)
+        np.maximum.at(highest, chunk_labels, chunk_distances)
+    sizes = np.bincount(np.asarray(labels), minlength=n_clusters)
+    labels.flush(), distances.flush()
+    del labels, distances
+
+    mean = total / np.maximum(sizes, 1)
+    std = np.sqrt(np.maximum(total_sq / np.maximum(sizes, 1) - np.square(mean), 0))
+    tmp_model = paths["model"] + ".tmp.npz"
+    np.savez(tmp_model, centroids=kmeans.cluster_centers_.astype(np.float32), sizes=sizes, mean_distance=mean,
+             std_distance=std, max_distance=highest, inertia=total_sq.sum(), warm_start=warm_start)
+    os.replace(tmp_labels, paths["labels"])
+    os.replace(tmp_distances, paths["distances"])
+    os.replace(tmp_model, paths["model"])
+    return Clusters(paths)
+
+
+def load_clusters(store, n_clusters=DEFAULT_CLUSTERS, cache_dirs=(CACHE_DIR,)):
+    # Same lookup order as load_projection; a new fit warm-starts from any
+    # cached fit of the store and is written to the last directory.
+    for cache_dir in cache_dirs:
+        paths = cache_paths(store, min(n_clusters, len(store)), cache_dir)
+        if all(os.path.exists(path) for path in paths.values()):
+            return Clusters(paths)
+    return fit_clusters(store, n_clusters, cache_dir=cache_dirs[-1], cache_dirs=cache_dirs)
+
+
+def top_categories(clusters, entity_news, categories, top=3):
+    # Categories of the news articles mentioning each cluster's entities.
+    # entity_news is the entities x news mention matrix whose first rows are
+    # the embedding rows; categories is the news Category column.
+    from scipy import sparse
+
+    n_rows = len(clusters.labels)
+    membership = sparse.csr_matrix((np.ones(n_rows, dtype=np.int64), (np.asarray(clusters.labels), np.arange(n_rows))),
+                                   shape=(clusters.n_clusters, n_rows))
+    mentions = entity_news[:n_rows].astype(np.int64)
+    codes = pd.Categorical(categories)
+    news_rows = np.flatnonzero(codes.codes >= 0)
+    news_categories = sparse.csr_matrix((np.ones(len(news_rows), dtype=np.int64), (news_rows, codes.codes[news_rows])),
+                                        shape=(len(codes), len(codes.categories)))
+    counts = (membership @ mentions @ news_categories).toarray()
+    names = np.asarray(codes.categories.astype(str))
+    labels = []
+    for row in counts:
+        best = np.argsort(-row, kind="stable")[:top]
+        labels.append(", ".join(f"{names[i]} ({row[i]})" for i in best if row[i] > 0))
+    return pd.Series(labels, index=pd.RangeIndex(clusters.n_clusters, name="Cluster"), name="Top Categories")
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from preprocess import DATA_DIR
+from dictionary import Dictionary
+
+TOP_K = 50
+BLOCK_NEWS = 512
+
+
+def coclick_paths():
+    return {"matrix": os.path.join(DATA_DIR, "coclick.npz")}
+
+
+def _prune_rows(block, top_k):
+    # Keeps the top_k largest entries of every row of a CSR block.
+    indptr, indices, data = [0], [], []
+    for row in range(block.shape[0]):
+        start, stop = block.indptr[row], block.indptr[row + 1]
+        row_data, row_indices = block.data[start:stop], block.indices[start:stop]
+        if len(row_data) > top_k:
+            keep = np.argpartition(-row_data, top_k - 1)[:top_k]
+            row_data, row_indices = row_data[keep], row_indices[keep]
+        order = np.argsort(-row_data, kind="stable")
+        indices.append(row_indices[order])
+        data.append(row_data[order])
+        indptr.append(indptr[-1] + len(order))
+    return indptr, indices, data
+
+
+def build_coclick_matrix(history=None, top_k=TOP_K, block_news=BLOCK_NEWS):
+    # news x news co-clicks = X.T @ X for the binary user x news matrix X,
+    # computed for block_news rows at a time so only one dense-ish block of
+    # products exists before it is pruned to top_k per row. Rows and columns
+    # are news dictionary codes, like the history matrix.
+    from user_history import HistoryIndex
+
+    history = history or HistoryIndex()
+    users_by_news = history.matrix.T.tocsr().astype(np.int32)
+    users_news = history.matrix.astype(np.int32)
+    n_news = users_by_news.shape[0]
+
+    indptr, indices, data = [0], [], []
+    for start in range(0, n_news, block_news):
+        block = (users_by_news[start:start + block_news] @ users_news).tocsr()
+        block_rows = np.repeat(np.arange(block.shape[0]), np.diff(block.indptr))
+        block.data[block.indices == block_rows + start] = 0
+        block.eliminate_zeros()
+        block_indptr, block_indices, block_data = _prune_rows(block, top_k)
+        indptr.extend(np.asarray(block_indptr[1:]) + indptr[-1])
+        indices.extend(block_indices)
+        data.extend(block_data)
+
+    matrix = sparse.csr_matrix(
+        (np.concatenate(data) if data else np.array([], dtype=np.int32),
+         np.concatenate(indices) if indices else np.array([], dtype=np.int32),
+         np.asarray(indptr)),
+        shape=(n_news, n_news),
+    )
+    sparse.save_npz(coclick_paths()["matrix"], matrix)
+    print(f"co-click matrix built: {matrix.nnz} pairs over {n_news} news")
+    return {"pairs": int(matrix.nnz), "top_k": top_k}
+
+
+class CoClickIndex:
+    def __init__(self):
+        self.matrix = sparse.load_npz(coclick_paths()["matrix"]).tocsr()
+        self.news = Dictionary("news")
+
+    def neighbours(self, news_id, k=10):
+        # Codes past the matrix belong to news added since it was built.
+        row = self.news.encode([news_id])[0]
+        if row < 0 or row >= self.matrix.shape[0]:
+            raise KeyError(news_id)
+        start, stop = self.matrix.indptr[row], min(self.matrix.indptr[row] + k, self.matrix.indptr[row + 1])
+        return pd.DataFrame({"News ID": self.news.decode(self.matrix.indices[start:stop]),
+                             "Co-clicks": self.matrix.data[start:stop]})
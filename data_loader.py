@@ -0,0 +1,312 @@
+import os
+
+import streamlit as st
+import pandas as pd
+
+from preprocess import MANIFEST_FILE, table_dataset, table_path
+from embedding_store import EmbeddingStore, store_paths
+from profiling import timed
+
+
+def file_signature(*paths):
+    # Cache keys include (mtime, size) of every backing file, so rerunning
+    # preprocess.py invalidates the cached objects without restarting the app.
+    signature = []
+    for path in paths:
+        if os.path.isdir(path):
+            # Partitioned tables: every file under the directory counts.
+            signature.append(file_signature(*sorted(
+                os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+            )))
+            continue
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _load_table(name, columns, signature):
+    return pd.read_parquet(table_path(name), columns=list(columns) if columns else None)
+
+
+@timed()
+def load_table(name, columns=None):
+    # Shared across sessions; callers must not mutate the returned frame.
+    columns = tuple(columns) if columns else None
+    return _load_table(name, columns, file_signature(table_path(name)))
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _table_info(name, preview_rows, signature):
+    dataset = table_dataset(name)
+    return dataset.count_rows(), dataset.head(preview_rows).to_pandas()
+
+
+@timed()
+def table_info(name, preview_rows=5):
+    # Row count comes from the Parquet footers and the preview from the first
+    # batch, so neither reads the full table.
+    return _table_info(name, preview_rows, file_signature(table_path(name)))
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _embedding_store(name, signature):
+    return EmbeddingStore(name)
+
+
+@timed()
+def embedding_store(name):
+    return _embedding_store(name, file_signature(*store_paths(name).values()))
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _history_index(signature):
+    from user_history import HistoryIndex
+
+    return HistoryIndex()
+
+
+@timed()
+def history_index():
+    # Imported lazily: scipy is only needed by pages that use the index.
+    from user_history import index_paths
+
+    return _history_index(file_signature(*index_paths().values()))
+
+
+@st.cache_data(max_entries=1, show_spinner=False)
+def _report_dirs(signature):
+    from report import STAGES, load_latest, stage_dir
+    from preprocess import load_manifest
+
+    latest, manifest = load_latest(), load_manifest()
+    return {name: stage_dir(name, latest, manifest) for name in STAGES}
+
+
+def report_dir(stage):
+    # Bundle directory written by report.py for this stage, or None when the
+    # pages have to compute it themselves.
+    from report import LATEST_FILE
+
+    return _report_dirs(file_signature(LATEST_FILE, MANIFEST_FILE)).get(stage)
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _report_table(name, bundle_dir):
+    return pd.read_parquet(os.path.join(bundle_dir, f"{name}.parquet"))
+
+
+@timed()
+def report_table(stage, name=None):
+    bundle_dir = report_dir(stage)
+    return None if bundle_dir is None else _report_table(name or stage, bundle_dir)
+
+
+def _cache_dirs(stage):
+    from projection import CACHE_DIR
+
+    bundle_dir = report_dir(stage)
+    return (CACHE_DIR,) if bundle_dir is None else (bundle_dir, CACHE_DIR)
+
+
+@st.cache_resource(max_entries=4, show_spinner="Fitting PCA projection...")
+def _projection(name, signature, cache_dirs):
+    from projection import load_projection
+
+    return load_projection(embedding_store(name), cache_dirs=cache_dirs)
+
+
+@timed()
+def projection(name):
+    # Read from the report bundle when it has one, otherwise fitted once per
+    # embedding version and cached on disk under data/cache.
+    cache_dirs = _cache_dirs(f"{name.split('_')[0]}_projection")
+    return _projection(name, file_signature(*store_paths(name).values()), cache_dirs)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _pca_extent(name, n_components, signature):
+    from scatter import extent
+
+    return extent(projection(name).coords(n_components))
+
+
+@timed()
+def pca_extent(name, n_components):
+    return _pca_extent(name, n_components, file_signature(*store_paths(name).values()))
+
+
+@st.cache_data(max_entries=32, show_spinner="Binning PCA coordinates...")
+def _pca_scatter(name, n_components, mode, bounds, budget, bins, signature):
+    import numpy as np
+    from scatter import density_grid, viewport_points
+
+    coords = projection(name).coords(n_components)
+    if mode == "density":
+        return density_grid(coords, np.asarray(bounds), bins)
+    return viewport_points(coords, np.asarray(bounds), budget)
+
+
+@timed()
+def pca_scatter(name, n_components, mode, bounds, budget=None, bins=None):
+    # Bounded payloads for the PCA scatters: a density grid ("density") or at
+    # most `budget` points ("points") inside bounds, one (low, high) per axis.
+    from scatter import GRID_BINS, POINT_BUDGET
+
+    bounds = tuple((float(low), float(high)) for low, high in bounds)
+    return _pca_scatter(name, n_components, mode, bounds, budget or POINT_BUDGET, bins or GRID_BINS,
+                        file_signature(*store_paths(name).values()))
+
+
+@st.cache_resource(max_entries=4, show_spinner="Computing dimension statistics...")
+def _dimension_stats(name, signature, cache_dirs):
+    from dimension_stats import load_stats
+
+    return load_stats(embedding_store(name), cache_dirs=cache_dirs)
+
+
+@timed()
+def dimension_stats(name):
+    cache_dirs = _cache_dirs(f"{name.split('_')[0]}_stats")
+    return _dimension_stats(name, file_signature(*store_paths(name).values()), cache_dirs)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _similarity_index(name, signature):
+    from similarity import SimilarityIndex
+
+    return SimilarityIndex(embedding_store(name))
+
+
+@timed()
+def similarity_index(name):
+    return _similarity_index(name, file_signature(*store_paths(name).values()))
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _ctr_aggregates(signature):
+    from impressions import CTRAggregates
+
+    return CTRAggregates()
+
+
+@timed()
+def ctr_aggregates():
+    from impressions import aggregates_path
+
+    return _ctr_aggregates(file_signature(aggregates_path()))
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _range_summary(start, end, signature):
+    from time_index import range_summary
+
+    return range_summary(start, end)
+
+
+@timed()
+def range_summary(start, end):
+    return _range_summary(start, end, file_signature(table_path("behaviors")))
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _entity_index(signature):
+    from entity_index import EntityIndex
+
+    return EntityIndex()
+
+
+@timed()
+def entity_index():
+    from entity_index import index_paths
+
+    return _entity_index(file_signature(*index_paths().values()))
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _coclick_index(signature):
+    from coclick import CoClickIndex
+
+    return CoClickIndex()
+
+
+@timed()
+def coclick_index():
+    from coclick import coclick_paths
+    from dictionary import dictionary_path
+
+    return _coclick_index(file_signature(*coclick_paths().values(), dictionary_path("news")))
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _user_store(signature):
+    # One store per server process: every session draws from the same bounded
+    # connection pool, and a rebuilt store replaces the old pool.
+    from user_store import UserStore
+
+    return UserStore()
+
+
+@timed()
+def user_store():
+    from user_store import store_path
+
+    return _user_store(file_signature(store_path()))
+
+
+@st.cache_resource(max_entries=1, show_spinner="Preparing triple scorer...")
+def _triple_scorer(signature):
+    # Shares the memory-mapped stores the other pages already hold.
+    from triples import TripleScorer
+
+    return TripleScorer(embedding_store("entity_embedding"), embedding_store("relation_embedding"))
+
+
+@timed()
+def triple_scorer():
+    return _triple_scorer(file_signature(*store_paths("entity_embedding").values(),
+                                         *store_paths("relation_embedding").values()))
+
+
+@st.cache_resource(max_entries=8, show_spinner="Clustering embeddings...")
+def _clusters(name, n_clusters, signature, cache_dirs):
+    from clustering import load_clusters
+
+    return load_clusters(embedding_store(name), n_clusters, cache_dirs=cache_dirs)
+
+
+@timed()
+def clusters(name, n_clusters):
+    # Read from the report bundle for the default cluster count, otherwise
+    # fitted once per embedding version and count and kept under data/cache;
+    # reruns and other sessions only load the stored assignments.
+    cache_dirs = _cache_dirs(f"{name.split('_')[0]}_clusters")
+    return _clusters(name, n_clusters, file_signature(*store_paths(name).values()), cache_dirs)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _cluster_summary(name, n_clusters, signature):
+    from clustering import top_categories
+
+    result = clusters(name, n_clusters)
+    summary = result.summary()
+    if name == "entity_embedding":
+        news = load_table("news", ["Category"])
+        summary["Top Categories"] = top_categories(result, entity_index().entity_news, news["Category"])
+    return summary
+
+
+@timed()
+def cluster_summary(name, n_clusters):
+    # Entity clusters are linked to news through the entity index, so their
+    # summary also depends on the news table and the mention matrix.
+    from entity_index import index_paths
+
+    signature = file_signature(*store_paths(name).values())
+    if name == "entity_embedding":
+        signature += file_signature(table_path("news"), *index_paths().values())
+    return _cluster_summary(name, n_clusters, signature)
@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from preprocess import DATA_DIR, iter_table_batches, load_manifest, table_path
+
+DICTIONARY_DIR = os.path.join(DATA_DIR, "dictionaries")
+META_FILE = os.path.join(DICTIONARY_DIR, "meta.json")
+SPACES = ["news", "user", "entity", "relation"]
+ENTITY_PATTERN = r'"WikidataId":\s*"([^"]+)"'
+
+
+def dictionary_path(space):
+    return os.path.join(DICTIONARY_DIR, f"{space}.npy")
+
+
+def extend_index(index, values):
+    new_values = pd.Index(values.unique()).difference(index, sort=False)
+    return index.append(new_values) if len(new_values) else index
+
+
+def load_meta():
+    if not os.path.exists(META_FILE):
+        return {}
+    with open(META_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_dictionary(space, index, base, source):
+    # Code i is the i-th value; the first `base` codes follow the row order of
+    # the space's primary table, so those codes double as row numbers there.
+    os.makedirs(DICTIONARY_DIR, exist_ok=True)
+    path = dictionary_path(space)
+    np.save(path + ".tmp.npy", np.asarray(index, dtype=str))
+    os.replace(path + ".tmp.npy", path)
+    meta = load_meta()
+    meta[space] = {"size": len(index), "base": int(base), "source": source}
+    with open(META_FILE + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, sort_keys=True)
+    os.replace(META_FILE + ".tmp", META_FILE)
+    return meta[space]
+
+
+def _split_news(column):
+    return column.fillna("").str.split().explode().dropna()
+
+
+def _behaviors_ids(frame):
+    users = frame["User ID"].dropna().astype(str)
+    shown = _split_news(frame["Impressions"]).str.replace(r"-\d$", "", regex=True)
+    return users, pd.concat([_split_news(frame["History"]), shown]).astype(str)
+
+
+def build_news_user_dictionaries(batch_rows=65536):
+    # News codes start with news.parquet order; IDs that only occur in
+    # behaviors are appended. User codes follow first appearance in time.
+    news_index = pd.Index(pd.read_parquet(table_path("news"), columns=["News ID"])["News ID"].astype(str))
+    base_news = len(news_index)
+    user_index = pd.Index([], dtype=object)
+    for batch in iter_table_batches("behaviors", ["User ID", "History", "Impressions"], batch_rows):
+        users, news = _behaviors_ids(batch.to_pandas())
+        user_index = extend_index(user_index, users)
+        news_index = extend_index(news_index, news)
+    news = save_dictionary("news", news_index, base_news, "news")
+    users = save_dictionary("user", user_index, len(user_index), "behaviors")
+    print(f"news/user dictionaries built: {news['size']} news, {users['size']} users")
+    return {"news": news["size"], "users": users["size"]}
+
+
+def extend_news_user_dictionaries(frame):
+    # IDs first seen in new behaviors are appended, so existing codes and the
+    # news base never change and extending with the same rows twice is a no-op.
+    meta = load_meta()
+    for space, values in zip(["user", "news"], _behaviors_ids(frame)):
+        dictionary = Dictionary(space)
+        index = extend_index(dictionary.values, values)
+        if len(index) > len(dictionary):
+            base = len(index) if space == "user" else dictionary.base
+            meta[space] = save_dictionary(space, index, base, meta[space]["source"])
+    return {"news": meta["news"]["size"], "users": meta["user"]["size"]}
+
+
+def _store_ids(name):
+    from embedding_store import EmbeddingStore, store_exists
+
+    if not store_exists(name):
+        return pd.Index([], dtype=object)
+    return pd.Index(np.char.decode(EmbeddingStore(name).ids, "utf-8").astype(object))
+
+
+def build_entity_dictionary():
+    # Embedding rows first, then entities that are mentioned in news but have
+    # no vector, so a code below `base` is also the embedding row.
+    entity_index = _store_ids("entity_embedding")
+    base = len(entity_index)
+    news = pd.read_parquet(table_path("news"), columns=["Title Entities", "Abstract Entities"])
+    for column in news.columns:
+        mentioned = news[column].fillna("").str.findall(ENTITY_PATTERN).explode().dropna()
+        entity_index = extend_index(entity_index, mentioned.astype(str))
+    meta = save_dictionary("entity", entity_index, base, "entity_embedding")
+    print(f"entity dictionary built: {meta['size']} entities, {meta['size'] - base} without embeddings")
+    return {"entities": meta["size"]}
+
+
+def build_relation_dictionary():
+    relation_index = _store_ids("relation_embedding")
+    meta = save_dictionary("relation", relation_index, len(relation_index), "relation_embedding")
+    return {"relations": meta["size"]}
+
+
+class Dictionary:
+    def __init__(self, space):
+        self.space = space
+        self.values = pd.Index(np.load(dictionary_path(space)))
+        self.base = load_meta()[space]["base"]
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, values):
+        # -1 marks values outside the dictionary.
+        return self.values.get_indexer(np.asarray(values, dtype=object)).astype(np.int32)
+
+    def decode(self, codes):
+        return self.values[np.asarray(codes)]
+
+
+def dictionary_exists(space):
+    return os.path.exists(dictionary_path(space)) and space in load_meta()
+
+
+def _string_bytes(values):
+    # Memory pandas needs for an object column of these strings.
+    return int(pd.Series(values, dtype=object).memory_usage(deep=True, index=False))
+
+
+def _session_bytes():
+    # The int32-encoded session layout of the user store: the code blobs as
+    # stored, int64 impression IDs and times, int32 user codes, and the news
+    # and user dictionaries needed to decode them.
+    from user_store import store_exists, store_path
+
+    if not store_exists():
+        return None
+    connection = sqlite3.connect(store_path())
+    try:
+        sessions, blobs = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length(history) + length(shown) + length(labels)), 0) FROM sessions"
+        ).fetchone()
+    finally:
+        connection.close()
+    return (blobs + (8 + 8 + 4) * sessions + _string_bytes(Dictionary("news").values)
+            + _string_bytes(Dictionary("user").values))
+
+
+def footprint_report(batch_rows=65536):
+    # Bytes per table as the original loaders held it (object strings,
+    # float64 embeddings) against what is loaded now: news.parquet with its
+    # categoricals, the embedding stores' ID arrays and float32 vectors, and
+    # behaviors as the user store's int32 code lists.
+    from embedding_store import EmbeddingStore, store_exists
+
+    rows = []
+    news = pd.read_parquet(table_path("news"))
+    rows.append({"Table": "news", "Rows": len(news),
+                 "Before": int(news.astype(object).memory_usage(deep=True, index=False).sum()),
+                 "After": int(news.memory_usage(deep=True, index=False).sum())})
+
+    before = n_rows = 0
+    for batch in iter_table_batches("behaviors", ["Impression ID", "User ID", "Time", "History", "Impressions"],
+                                    batch_rows):
+        frame = batch.to_pandas()
+        n_rows += len(frame)
+        before += 16 * len(frame) + sum(_string_bytes(frame[column])
+                                        for column in ["User ID", "History", "Impressions"])
+    after = _session_bytes()
+    if after is not None:
+        rows.append({"Table": "behaviors (user store sessions)", "Rows": n_rows, "Before": before, "After": after})
+
+    for name in ["entity_embedding", "relation_embedding"]:
+        if store_exists(name):
+            store = EmbeddingStore(name)
+            rows.append({"Table": name, "Rows": len(store.ids),
+                         "Before": _string_bytes(store.ids.astype(str)) + 8 * store.vectors.size,
+                         "After": (store.ids.nbytes + store._order.nbytes + store._sorted_ids.nbytes
+                                   + store.vectors.nbytes)})
+
+    report = pd.DataFrame(rows).set_index("Table")
+    report["Ratio"] = (report["Before"] / report["After"]).round(2)
+    report["Before MB"] = (report.pop("Before") / 2**20).round(2)
+    report["After MB"] = (report.pop("After") / 2**20).round(2)
+    report = report[["Rows", "Before MB", "After MB", "Ratio"]]
+    return report
+
+
+if __name__ == "__main__":
+    if not load_manifest():
+        sys.exit("run preprocess.py first")
+    print(footprint_report().to_string())
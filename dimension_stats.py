@@ -0,0 +1,143 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from preprocess import DIM_COLUMNS
+from projection import CACHE_DIR, iter_chunks
+
+HIST_BINS = 20
+# Streaming mode keeps a fine histogram per dimension and reads quantiles
+# from it; each display bin is an exact sum of SKETCH_FACTOR fine bins.
+SKETCH_FACTOR = 128
+IN_MEMORY_LIMIT = 512 * 1024 * 1024
+CHUNK_ROWS = 65536
+
+
+def _binned_counts(chunk, low, width, n_bins):
+    index = np.floor((chunk - low) / width).astype(np.int64)
+    index = np.clip(index, 0, n_bins - 1) + np.arange(chunk.shape[1]) * n_bins
+    return np.bincount(index.ravel(), minlength=chunk.shape[1] * n_bins).reshape(chunk.shape[1], n_bins)
+
+
+def _bin_width(low, high, n_bins):
+    width = (high - low) / n_bins
+    return np.where(width > 0, width, 1.0)
+
+
+def exact_stats(vectors, bins=HIST_BINS):
+    data = np.asarray(vectors, dtype=np.float32)
+    low, q1, median, q3, high = np.quantile(data, [0, 0.25, 0.5, 0.75, 1], axis=0)
+    iqr = q3 - q1
+    lower_fence, upper_fence = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+    inside = (data >= lower_fence) & (data <= upper_fence)
+    width = _bin_width(low, high, bins)
+    return {
+        "min": low, "q1": q1, "median": median, "q3": q3, "max": high,
+        "mean": data.mean(axis=0, dtype=np.float64), "std": data.std(axis=0, ddof=1, dtype=np.float64),
+        "outliers": (~inside).sum(axis=0),
+        "whislo": np.where(inside, data, np.inf).min(axis=0),
+        "whishi": np.where(inside, data, -np.inf).max(axis=0),
+        "hist_counts": _binned_counts(data, low, width, bins),
+        "hist_edges": low[:, None] + width[:, None] * np.arange(bins + 1),
+    }
+
+
+def streaming_stats(vectors, bins=HIST_BINS, chunk_rows=CHUNK_ROWS):
+    n_rows, n_dims = vectors.shape
+    low = np.full(n_dims, np.inf)
+    high = np.full(n_dims, -np.inf)
+    total = np.zeros(n_dims)
+    total_sq = np.zeros(n_dims)
+    for start, stop in iter_chunks(n_rows, chunk_rows):
+        chunk = np.asarray(vectors[start:stop], dtype=np.float64)
+        low = np.minimum(low, chunk.min(axis=0))
+        high = np.maximum(high, chunk.max(axis=0))
+        total += chunk.sum(axis=0)
+        total_sq += np.square(chunk).sum(axis=0)
+
+    fine_bins = bins * SKETCH_FACTOR
+    fine_width = _bin_width(low, high, fine_bins)
+    fine_counts = np.zeros((n_dims, fine_bins), dtype=np.int64)
+    for start, stop in iter_chunks(n_rows, chunk_rows):
+        fine_counts += _binned_counts(np.asarray(vectors[start:stop], dtype=np.float64), low, fine_width, fine_bins)
+
+    fine_edges = low[:, None] + fine_width[:, None] * np.arange(fine_bins + 1)
+    cumulative = np.cumsum(fine_counts, axis=1)
+
+    def quantile(q):
+        # Linear interpolation inside the fine bin holding the q-th row.
+        target = q * (n_rows - 1) + 1
+        index = np.minimum((cumulative < target).sum(axis=1), fine_bins - 1)
+        before = np.where(index > 0, cumulative[np.arange(n_dims), index - 1], 0)
+        in_bin = np.maximum(fine_counts[np.arange(n_dims), index], 1)
+        fraction = np.clip((target - before) / in_bin, 0, 1)
+        return fine_edges[np.arange(n_dims), index] + fraction * fine_width
+
+    q1, median, q3 = quantile(0.25), quantile(0.5), quantile(0.75)
+    iqr = q3 - q1
+    centers = (fine_edges[:, :-1] + fine_edges[:, 1:]) / 2
+    inside = (centers >= (q1 - 1.5 * iqr)[:, None]) & (centers <= (q3 + 1.5 * iqr)[:, None]) & (fine_counts > 0)
+    mean = total / max(n_rows, 1)
+    var = (total_sq - n_rows * np.square(mean)) / max(n_rows - 1, 1)
+    return {
+        "min": low, "q1": q1, "median": median, "q3": q3, "max": high,
+        "mean": mean, "std": np.sqrt(np.maximum(var, 0)),
+        "outliers": np.where(inside, 0, fine_counts).sum(axis=1),
+        "whislo": np.where(inside, centers, np.inf).min(axis=1),
+        "whishi": np.where(inside, centers, -np.inf).max(axis=1),
+        "hist_counts": fine_counts.reshape(n_dims, bins, SKETCH_FACTOR).sum(axis=2),
+        "hist_edges": fine_edges[:, ::SKETCH_FACTOR],
+    }
+
+
+class DimensionStats:
+    def __init__(self, arrays, columns):
+        self.arrays = arrays
+        self.columns = list(columns)
+        self._position = {column: i for i, column in enumerate(self.columns)}
+
+    def summary(self, fields=("min", "q1", "median", "q3", "max")):
+        labels = {"q1": "25%", "median": "50%", "q3": "75%"}
+        return pd.DataFrame({labels.get(field, field): self.arrays[field] for field in fields}, index=self.columns)
+
+    def histogram(self, column):
+        i = self._position[column]
+        return self.arrays["hist_counts"][i], self.arrays["hist_edges"][i]
+
+    def box(self, column):
+        # Matches the dict layout expected by Axes.bxp.
+        i = self._position[column]
+        return {"label": column, "whislo": self.arrays["whislo"][i], "q1": self.arrays["q1"][i],
+                "med": self.arrays["median"][i], "q3": self.arrays["q3"][i],
+                "whishi": self.arrays["whishi"][i], "fliers": []}
+
+
+def cache_path(store, bins, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"stats_{store.name}_{store.version[:16]}_{bins}.npz")
+
+
+def compute_stats(store, bins=HIST_BINS, streaming=None):
+    vectors = store.vectors
+    if streaming is None:
+        streaming = vectors.nbytes > IN_MEMORY_LIMIT
+    arrays = streaming_stats(vectors, bins) if streaming else exact_stats(vectors, bins)
+    return {name: np.asarray(value) for name, value in arrays.items()}
+
+
+def save_stats(store, bins=HIST_BINS, cache_dir=CACHE_DIR):
+    arrays = compute_stats(store, bins)
+    path = cache_path(store, bins, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(path + ".tmp.npz", **arrays)
+    os.replace(path + ".tmp.npz", path)
+    return arrays
+
+
+def load_stats(store, bins=HIST_BINS, cache_dirs=(CACHE_DIR,)):
+    for cache_dir in cache_dirs:
+        path = cache_path(store, bins, cache_dir)
+        if os.path.exists(path):
+            with np.load(path) as cached:
+                return DimensionStats(dict(cached), DIM_COLUMNS[:store.dims])
+    return DimensionStats(save_stats(store, bins, cache_dirs[-1]), DIM_COLUMNS[:store.dims])
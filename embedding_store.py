@@ -0,0 +1,123 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from preprocess import DATA_DIR, DIM_COLUMNS, file_checksum
+
+CHUNK_ROWS = 65536
+
+
+def store_paths(name):
+    base = os.path.join(DATA_DIR, name)
+    return {"vectors": base + ".npy", "ids": base + "_ids.npy",
+            "order": base + "_order.npy", "meta": base + ".json"}
+
+
+def _count_lines(path):
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def build_embedding_store(input_file, name, id_column, checksum=None, chunk_rows=CHUNK_ROWS):
+    paths = store_paths(name)
+    n_rows = _count_lines(input_file)
+    n_dims = len(DIM_COLUMNS)
+    tmp_vectors = paths["vectors"] + ".tmp"
+    vectors = np.lib.format.open_memmap(tmp_vectors, mode="w+", dtype=np.float32, shape=(n_rows, n_dims))
+
+    ids = []
+    col_sum = np.zeros(n_dims, dtype=np.float64)
+    col_count = np.zeros(n_dims, dtype=np.int64)
+    reader = pd.read_csv(input_file, sep="\t", header=None, usecols=range(n_dims + 1),
+                         dtype={0: str, **{i: np.float32 for i in range(1, n_dims + 1)}},
+                         quoting=3, encoding="utf-8", chunksize=chunk_rows)
+    start = 0
+    for chunk in reader:
+        block = chunk.iloc[:, 1:].to_numpy(dtype=np.float32)
+        vectors[start:start + len(block)] = block
+        valid = ~np.isnan(block)
+        col_sum += np.where(valid, block, 0).sum(axis=0)
+        col_count += valid.sum(axis=0)
+        ids.append(chunk.iloc[:, 0].to_numpy(dtype=str))
+        start += len(block)
+
+    # Mean-impute missing values once here so readers never need an imputer.
+    if (col_count < start).any():
+        col_mean = (col_sum / np.maximum(col_count, 1)).astype(np.float32)
+        for lo in range(0, start, chunk_rows):
+            block = vectors[lo:lo + chunk_rows]
+            missing = np.isnan(block)
+            if missing.any():
+                block[missing] = np.broadcast_to(col_mean, block.shape)[missing]
+    vectors.flush()
+    del vectors
+
+    ids = np.char.encode(np.concatenate(ids) if ids else np.array([], dtype=str), "utf-8")
+    np.save(paths["ids"], ids)
+    np.save(paths["order"], np.argsort(ids, kind="stable").astype(np.int64))
+    os.replace(tmp_vectors, paths["vectors"])
+    meta = {"name": name, "id_column": id_column, "rows": int(start), "dims": n_dims,
+            "source": input_file, "checksum": checksum or file_checksum(input_file)}
+    with open(paths["meta"], "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    print(f"{input_file} has been converted to {paths['vectors']}")
+    return meta
+
+
+class EmbeddingStore:
+    def __init__(self, name):
+        paths = store_paths(name)
+        with open(paths["meta"], encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.name = name
+        self.id_column = self.meta["id_column"]
+        self.vectors = np.load(paths["vectors"], mmap_mode="r")
+        self.ids = np.load(paths["ids"])
+        self._order = np.load(paths["order"])
+        self._sorted_ids = self.ids[self._order]
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def dims(self):
+        return self.vectors.shape[1]
+
+    @property
+    def version(self):
+        return self.meta["checksum"]
+
+    def rows(self, ids):
+        encoded = np.char.encode(np.asarray(ids, dtype=str), "utf-8")
+        if len(self) == 0:
+            return np.full(len(encoded), -1, dtype=np.int64)
+        # IDs longer than the stored width would be truncated into false matches.
+        too_long = np.char.str_len(encoded) > self.ids.dtype.itemsize
+        keys = encoded.astype(self.ids.dtype)
+        pos = np.minimum(np.searchsorted(self._sorted_ids, keys), len(self) - 1)
+        found = (self._sorted_ids[pos] == keys) & ~too_long
+        return np.where(found, self._order[pos], -1)
+
+    def row(self, entity_id):
+        row = self.rows([entity_id])[0]
+        if row < 0:
+            raise KeyError(entity_id)
+        return int(row)
+
+    def vector(self, entity_id):
+        return self.vectors[self.row(entity_id)]
+
+    def id_at(self, rows):
+        return np.char.decode(self.ids[rows], "utf-8")
+
+    def frame(self, start=0, stop=None):
+        block = self.vectors[start:stop]
+        frame = pd.DataFrame(block, columns=DIM_COLUMNS[:self.dims], copy=False)
+        frame.insert(0, self.id_column, self.id_at(slice(start, start + len(block))))
+        return frame
+
+
+def store_exists(name):
+    return all(os.path.exists(path) for path in store_paths(name).values())
@@ -1,11 +1,14 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.decomposition import PCA
-from sklearn.impute import SimpleImputer
+from matplotlib.colors import LogNorm
+from matplotlib.ticker import MaxNLocator
 from mpl_toolkits.mplot3d import Axes3D
-import os
+
+import data_loader
+import figures
+import profiling
+from embedding_store import store_exists, store_paths
 
 
 
@@ -19,25 +22,20 @@ def render():
     """)
 
     
-    file_path = "data/entity_embedding.csv"
-    if not os.path.exists(file_path):
-        st.error(f"File not found: {file_path}")
+    if not store_exists("entity_embedding"):
+        st.error(f"File not found: {store_paths('entity_embedding')['vectors']}")
         return
-    
-    entities = pd.read_csv(file_path)
 
-    
-    entities = entities.dropna(axis=1, how="all")
-
-    
-    imputer = SimpleImputer(strategy="mean")
-    entities.iloc[:, 1:] = imputer.fit_transform(entities.iloc[:, 1:])
+    store = data_loader.embedding_store("entity_embedding")
+    stats = data_loader.dimension_stats("entity_embedding")
 
 
+    profiling.section("Sample of Entity Embeddings")
     st.write("### 🔍 Sample of Entity Embeddings")
-    st.dataframe(entities.head())
+    st.dataframe(store.frame(0, 5))
 
     
+    profiling.section("Histogram Analysis")
     st.write("### 📈 Histogram Analysis")
     user_input = st.text_input("Select dimensions to analyze (e.g., `1, 2, 3`):", "1, 2, 3")
 
@@ -49,69 +47,159 @@ def render():
 
     for dim in selected_dims:
         col_name = f"Dim_{dim}"
-        if col_name in entities.columns:
+        if col_name in stats.columns:
             st.write(f"#### 📊 Histogram for Dimension {dim} 🎯")
-            fig, ax = plt.subplots()
-            ax.hist(entities[col_name], bins=20, color="skyblue", edgecolor="black")
-            ax.set_title(f"Distribution of Dimension {dim}")
-            ax.set_xlabel("Value")
-            ax.set_ylabel("Frequency")
-            st.pyplot(fig)
+
+            def draw_histogram(fig, dim=dim, col_name=col_name):
+                counts, edges = stats.histogram(col_name)
+                ax = fig.subplots()
+                ax.stairs(counts, edges, fill=True, color="skyblue", edgecolor="black")
+                ax.set_title(f"Distribution of Dimension {dim}")
+                ax.set_xlabel("Value")
+                ax.set_ylabel("Frequency")
+
+            figures.show(("histogram", store.version, col_name), draw_histogram, figsize=(6.4, 4.8))
             st.write("""
             **🧐 Why this matters:**
             - Histograms reveal the distribution of values, helping identify patterns like skewness or outliers.
             """)
 
     
+    profiling.section("What is PCA?")
     st.write("### 🌌 What is PCA?")
     st.write("""
     Principal Component Analysis (PCA) reduces high-dimensional data into lower dimensions while retaining the most variance. Let's explore it step-by-step!
     """)
 
     
+    profiling.section("Step-by-Step 2D PCA Explanation")
     st.write("### 🟢 Step-by-Step 2D PCA Explanation")
-    standardized_data = (entities.iloc[:, 1:] - entities.iloc[:, 1:].mean()) / entities.iloc[:, 1:].std()
-    standardized_data = standardized_data.fillna(0)
+    projection = data_loader.projection("entity_embedding")
+    explained = projection.explained_variance_ratio
 
-    
-    pca_2d = PCA(n_components=2)
     try:
-        pca_result_2d = pca_2d.fit_transform(standardized_data)
+        pca_result_2d = projection.coords(2)
         st.write("#### 2D PCA Result")
-        st.dataframe(pd.DataFrame(pca_result_2d, columns=["PCA_1", "PCA_2"]).head())
-
-        fig, ax = plt.subplots(figsize=(8, 4))
-        ax.scatter(pca_result_2d[:, 0], pca_result_2d[:, 1], alpha=0.6, color="purple")
-        ax.set_title("2D PCA Scatter Plot")
-        ax.set_xlabel("PCA Component 1")
-        ax.set_ylabel("PCA Component 2")
-        st.pyplot(fig)
+        st.dataframe(pd.DataFrame(pca_result_2d[:5], columns=["PCA_1", "PCA_2"]))
+        st.write(f"Explained variance: {explained[:2].sum():.1%}")
+
+        # The scatters never plot more than the point budget: the full view is
+        # a density grid or a stratified sample, and zooming in far enough
+        # shows the exact points of that region.
+        full_extent = data_loader.pca_extent("entity_embedding", 3)
+        scatter_mode = st.radio("Scatter plot:", ["Density grid", "Sampled points"], horizontal=True)
+        point_budget = st.slider("Point budget:", 1000, 50000, 5000, step=1000)
+        x_range = st.slider("PCA 1 range:", *map(float, full_extent[0]), value=tuple(map(float, full_extent[0])))
+        y_range = st.slider("PCA 2 range:", *map(float, full_extent[1]), value=tuple(map(float, full_extent[1])))
+        bounds_2d = (x_range, y_range)
+
+        grid, grid_edges = data_loader.pca_scatter("entity_embedding", 2, "density", bounds_2d)
+        in_view = int(grid.sum())
+        if scatter_mode == "Density grid" and in_view > point_budget:
+            st.caption(f"{in_view:,} points in view, binned on a {grid.shape[0]}x{grid.shape[1]} grid.")
+        else:
+            sample_rows, sample_2d = data_loader.pca_scatter("entity_embedding", 2, "points", bounds_2d, point_budget)
+            exact = "exact" if len(sample_rows) == in_view else "stratified sample"
+            st.caption(f"Showing {len(sample_rows):,} of {in_view:,} points in view ({exact}).")
+
+        def draw_pca_2d(fig):
+            ax = fig.subplots()
+            if scatter_mode == "Density grid" and in_view > point_budget:
+                mesh = ax.pcolormesh(grid_edges[0], grid_edges[1], np.ma.masked_equal(grid.T, 0),
+                                     cmap="Purples", norm=LogNorm())
+                fig.colorbar(mesh, ax=ax, label="Entities")
+            else:
+                ax.scatter(sample_2d[:, 0], sample_2d[:, 1], alpha=0.6, color="purple", s=8)
+            ax.set_xlim(x_range)
+            ax.set_ylim(y_range)
+            ax.set_title("2D PCA Scatter Plot")
+            ax.set_xlabel("PCA Component 1")
+            ax.set_ylabel("PCA Component 2")
+
+        figures.show(("pca_2d", store.version, scatter_mode, point_budget, bounds_2d), draw_pca_2d, figsize=(8, 4))
     except Exception as e:
         st.error(f"Error performing 2D PCA: {e}")
 
     
+    profiling.section("Step-by-Step 3D PCA Explanation")
     st.write("### 🔵 Step-by-Step 3D PCA Explanation")
-    pca_3d = PCA(n_components=3)
     try:
-        pca_result_3d = pca_3d.fit_transform(standardized_data)
+        pca_result_3d = projection.coords(3)
         st.write("### 3D PCA Result")
-        st.dataframe(pd.DataFrame(pca_result_3d, columns=["PCA_1", "PCA_2", "PCA_3"]).head())
-
-        fig = plt.figure(figsize=(10, 7))
-        ax = fig.add_subplot(111, projection='3d')
-        ax.scatter(pca_result_3d[:, 0], pca_result_3d[:, 1], pca_result_3d[:, 2], alpha=0.6, color="teal")
-        ax.set_title("3D PCA Scatter Plot")
-        ax.set_xlabel("PCA Component 1")
-        ax.set_ylabel("PCA Component 2")
-        ax.set_zlabel("PCA Component 3")
-        st.pyplot(fig)
+        st.dataframe(pd.DataFrame(pca_result_3d[:5], columns=["PCA_1", "PCA_2", "PCA_3"]))
+        st.write(f"Explained variance: {explained[:3].sum():.1%}")
+
+        bounds_3d = bounds_2d + (tuple(map(float, full_extent[2])),)
+        sample_rows_3d, sample_3d = data_loader.pca_scatter("entity_embedding", 3, "points", bounds_3d, point_budget)
+        st.caption(f"Showing {len(sample_rows_3d):,} points of the PCA 1/PCA 2 range above.")
+
+        def draw_pca_3d(fig):
+            ax = fig.add_subplot(111, projection='3d')
+            ax.scatter(sample_3d[:, 0], sample_3d[:, 1], sample_3d[:, 2], alpha=0.6, color="teal", s=8)
+            ax.set_title("3D PCA Scatter Plot")
+            ax.set_xlabel("PCA Component 1")
+            ax.set_ylabel("PCA Component 2")
+            ax.set_zlabel("PCA Component 3")
+
+        figures.show(("pca_3d", store.version, point_budget, bounds_2d), draw_pca_3d, figsize=(10, 7))
     except Exception as e:
         st.error(f"Error performing 3D PCA: {e}")
 
+    st.write("#### Explained Variance by Component")
+    st.bar_chart(pd.Series(explained, index=[f"PCA_{i}" for i in range(1, len(explained) + 1)]))
+
+
+
+    profiling.section("Nearest Entities")
+    st.write("### 🔎 Nearest Entities")
+    query_input = st.text_input("Entity IDs to look up (e.g., `Q41, Q30`):", ", ".join(store.id_at(slice(0, 1))))
+    query_ids = [entity_id.strip() for entity_id in query_input.split(",") if entity_id.strip()]
+    top_k = st.slider("Neighbours per entity:", 1, 50, 10)
+    search_mode = st.radio("Search mode:", ["Exact", "Approximate (IVF)"], horizontal=True)
+    if query_ids:
+        try:
+            neighbours = data_loader.similarity_index("entity_embedding").search(
+                query_ids, top_k, mode="exact" if search_mode == "Exact" else "approximate"
+            )
+            st.dataframe(neighbours, hide_index=True)
+        except KeyError as e:
+            st.error(f"Unknown entity IDs: {e.args[0]}")
+
+
+
+    profiling.section("Entities in the News")
+    st.write("### 📰 Entities in the News")
+    mentions = data_loader.entity_index()
+    ctr = data_loader.ctr_aggregates()
+    min_impressions = st.slider("Minimum impressions per entity:", 1, 1000, 50)
+    entity_ctr = mentions.entity_ctr(ctr.arrays["news_shown"], ctr.arrays["news_clicks"], min_impressions)
+    st.write("**Most mentioned entities and their click-through rate:**")
+    st.dataframe(entity_ctr.sort_values("Articles", ascending=False).head(20))
+
+    entity_lookup = st.text_input("Show articles mentioning entity:", mentions.popularity().index[0] if len(mentions.entity_ids) else "")
+    if entity_lookup:
+        news = data_loader.load_table("news", ["News ID", "Category", "Title"])
+        st.dataframe(news.iloc[mentions.news_rows(entity_lookup.strip())], hide_index=True)
+
+
+
+    profiling.section("Entity Clusters")
+    st.write("### 🧩 Entity Clusters")
+    n_clusters = st.slider("Number of clusters:", 2, 100, 20)
+    clusters = data_loader.clusters("entity_embedding", n_clusters)
+    cluster_summary = data_loader.cluster_summary("entity_embedding", n_clusters)
+    st.write("**Cluster sizes, spread of distances to the centroid and the news categories mentioning them:**")
+    st.dataframe(cluster_summary.round(3))
+    selected_cluster = st.selectbox("Show entities closest to the centroid of cluster:", cluster_summary.index)
+    members = clusters.members(selected_cluster, 20)
+    st.dataframe(pd.DataFrame({"Entity ID": store.id_at(members), "Distance": clusters.distances[members]}),
+                 hide_index=True)
+
 
 
+    profiling.section("Box Plot for Dimensions")
     st.write("### 📦 Box Plot for Dimensions")
-    summary = entities.describe().T[['min', '25%', '50%', '75%', 'max']]
+    summary = stats.summary()
     st.subheader("📌 Five Number Summary")
     st.dataframe(summary)
 
@@ -119,26 +207,26 @@ def render():
 
     selected_dims_boxplot = st.multiselect(
         "Select dimensions for box plot visualization:",
-        entities.columns[1:],
-        default=entities.columns[1:5].tolist()  
+        stats.columns,
+        default=stats.columns[:4]
     )
 
 
     if selected_dims_boxplot:
-        fig, ax = plt.subplots(figsize=(8, 4))
-        boxplot_data = entities[selected_dims_boxplot]
-        boxplot_data.boxplot(ax=ax)
-        ax.set_title("Box Plot of Selected Dimensions")
-        ax.set_ylabel("Values")
-        ax.set_xlabel("Dimensions")
-
-       
-        y_min = boxplot_data.min().min()  
-        y_max = boxplot_data.max().max()  
-        ax.set_ylim(y_min - 0.1 * abs(y_min), y_max + 0.1 * abs(y_max))  
-        ax.yaxis.set_major_locator(plt.MaxNLocator(nbins=10))  
-
-        st.pyplot(fig)
+        def draw_boxplot(fig):
+            ax = fig.subplots()
+            ax.bxp([stats.box(col) for col in selected_dims_boxplot], showfliers=False)
+            ax.set_title("Box Plot of Selected Dimensions")
+            ax.set_ylabel("Values")
+            ax.set_xlabel("Dimensions")
+
+           
+            y_min = summary.loc[selected_dims_boxplot, "min"].min()
+            y_max = summary.loc[selected_dims_boxplot, "max"].max()
+            ax.set_ylim(y_min - 0.1 * abs(y_min), y_max + 0.1 * abs(y_max))  
+            ax.yaxis.set_major_locator(MaxNLocator(nbins=10))  
+
+        figures.show(("boxplot", store.version, tuple(selected_dims_boxplot)), draw_boxplot, figsize=(8, 4))
     else:
         st.write("Select at least one dimension to view the box plot.")
 
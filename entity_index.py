@@ -0,0 +1,141 @@
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scipy import sparse
+
+from preprocess import DATA_DIR, table_path
+from dictionary import Dictionary, dictionary_path
+
+ENTITY_FIELDS = ["Title Entities", "Abstract Entities"]
+CHUNK_ROWS = 20000
+
+
+def index_paths():
+    base = os.path.join(DATA_DIR, "news_entity")
+    return {"mentions": table_path("news_entities"), "matrix": base + "_index.npz",
+            "entities": dictionary_path("entity"), "vectors": base + "_vectors.npy"}
+
+
+def parse_entities(start, columns):
+    # columns holds one list of JSON strings per entity field; returns flat
+    # mention arrays with offsets kept as a CSR-style (ptr, values) pair.
+    news_rows, fields, entity_ids, types, confidences, offsets_ptr, offsets = [], [], [], [], [], [0], []
+    for field, values in enumerate(columns):
+        for row, value in enumerate(values, start):
+            if not isinstance(value, str) or value in ("", "[]"):
+                continue
+            for mention in json.loads(value):
+                news_rows.append(row)
+                fields.append(field)
+                entity_ids.append(mention.get("WikidataId", ""))
+                types.append(mention.get("Type", ""))
+                confidences.append(mention.get("Confidence", np.nan))
+                offsets.extend(mention.get("OccurrenceOffsets", []))
+                offsets_ptr.append(len(offsets))
+    return {"news_row": np.asarray(news_rows, dtype=np.int32), "field": np.asarray(fields, dtype=np.int8),
+            "entity_id": entity_ids, "type": types, "confidence": np.asarray(confidences, dtype=np.float32),
+            "offsets_ptr": np.asarray(offsets_ptr, dtype=np.int64), "offsets": np.asarray(offsets, dtype=np.int32)}
+
+
+def _mentions_table(parts):
+    offsets_ptr, base = [np.zeros(1, dtype=np.int64)], 0
+    for part in parts:
+        offsets_ptr.append(part["offsets_ptr"][1:] + base)
+        base += len(part["offsets"])
+    offsets = pa.ListArray.from_arrays(pa.array(np.concatenate(offsets_ptr).astype(np.int32)),
+                                       pa.array(np.concatenate([p["offsets"] for p in parts]), pa.int32()))
+    field_names = np.array([name.split()[0] for name in ENTITY_FIELDS])
+    return pa.table({
+        "News Row": np.concatenate([p["news_row"] for p in parts]),
+        "Field": pa.array(field_names[np.concatenate([p["field"] for p in parts])]).dictionary_encode(),
+        "Entity ID": pa.array([e for p in parts for e in p["entity_id"]], pa.string()),
+        "Type": pa.array([t for p in parts for t in p["type"]], pa.string()).dictionary_encode(),
+        "Confidence": np.concatenate([p["confidence"] for p in parts]),
+        "Occurrence Offsets": offsets,
+    })
+
+
+def build_entity_index(chunk_rows=CHUNK_ROWS, workers=None):
+    from embedding_store import EmbeddingStore, store_exists
+
+    news = pd.read_parquet(table_path("news"), columns=ENTITY_FIELDS)
+    starts = list(range(0, len(news), chunk_rows))
+    chunks = [[news[field].iloc[start:start + chunk_rows].tolist() for field in ENTITY_FIELDS] for start in starts]
+    workers = workers or max(1, min(len(chunks), os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(parse_entities, starts, chunks)) or [parse_entities(0, [[], []])]
+
+    # Mentions are ordered by news row so each article's rows are contiguous.
+    mentions = _mentions_table(parts)
+    mentions = mentions.take(pa.array(np.argsort(mentions["News Row"].to_numpy(), kind="stable")))
+    paths = index_paths()
+    pq.write_table(mentions, paths["mentions"] + ".tmp", compression="zstd")
+    os.replace(paths["mentions"] + ".tmp", paths["mentions"])
+
+    # Columns are shared entity dictionary codes; codes below its base are
+    # embedding rows.
+    entities = Dictionary("entity")
+    entity_codes = entities.encode(mentions["Entity ID"].to_pandas())
+    known = entity_codes >= 0
+    matrix = sparse.csr_matrix(
+        (np.ones(int(known.sum()), dtype=np.float32), (mentions["News Row"].to_numpy()[known], entity_codes[known])),
+        shape=(len(news), len(entities)),
+    )
+    matrix.sum_duplicates()
+    sparse.save_npz(paths["matrix"], matrix)
+
+    # Mean entity vector per article: row-normalized mention counts times the
+    # embeddings of entities that have one. Articles without any stay zero.
+    vectors = np.zeros((len(news), 0), dtype=np.float32)
+    if store_exists("entity_embedding") and entities.base:
+        weights = matrix[:, :entities.base]
+        totals = np.asarray(weights.sum(axis=1)).ravel()
+        weights = sparse.diags(1 / np.where(totals > 0, totals, 1)) @ weights
+        vectors = np.asarray(weights @ EmbeddingStore("entity_embedding").vectors, dtype=np.float32)
+    np.save(paths["vectors"], vectors)
+    n_entities = int(np.count_nonzero(np.diff(matrix.tocsc().indptr)))
+    print(f"entity index built: {len(mentions)} mentions of {n_entities} entities")
+    return {"mentions": int(len(mentions)), "entities": n_entities}
+
+
+class EntityIndex:
+    def __init__(self):
+        paths = index_paths()
+        self.news_entities = sparse.load_npz(paths["matrix"]).tocsr()
+        self.entity_news = self.news_entities.T.tocsr()
+        self.entity_ids = Dictionary("entity").values
+        self.news_vectors = np.load(paths["vectors"], mmap_mode="r")
+        self._mentions_file = paths["mentions"]
+
+    def news_rows(self, entity_id):
+        code = self.entity_ids.get_indexer([entity_id])[0]
+        if code < 0:
+            return np.array([], dtype=np.int32)
+        return self.entity_news.indices[self.entity_news.indptr[code]:self.entity_news.indptr[code + 1]]
+
+    def entity_codes(self, news_row):
+        return self.news_entities.indices[self.news_entities.indptr[news_row]:self.news_entities.indptr[news_row + 1]]
+
+    def mentions(self, news_rows):
+        table = pq.read_table(self._mentions_file, filters=[("News Row", "in", list(map(int, news_rows)))])
+        return table.to_pandas()
+
+    def popularity(self):
+        counts = np.diff(self.entity_news.indptr)
+        return pd.Series(counts, index=self.entity_ids, name="Articles").sort_values(ascending=False, kind="stable")
+
+    def entity_ctr(self, news_shown, news_clicks, min_impressions=1):
+        # An entity's impressions and clicks are those of the articles mentioning it.
+        mentioned = self.entity_news.astype(np.int64)
+        mentioned.data[:] = 1
+        shown = mentioned @ news_shown
+        clicks = mentioned @ news_clicks
+        frame = pd.DataFrame({"Articles": np.diff(mentioned.indptr), "Impressions": shown, "Clicks": clicks},
+                             index=self.entity_ids)
+        frame["CTR"] = np.divide(clicks, shown, out=np.zeros(len(shown)), where=shown > 0)
+        return frame[frame["Impressions"] >= min_impressions]
@@ -0,0 +1,98 @@
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+from matplotlib.figure import Figure
+
+import profiling
+
+# Rendered charts are shared by every session of the server process; the
+# cache holds at most MAX_ENTRIES images and MAX_BYTES of encoded data.
+MAX_ENTRIES = 128
+MAX_BYTES = 64 * 1024 * 1024
+DPI = 200
+
+
+class FigureCache:
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = data
+            self.size += len(data)
+            while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+CACHE = FigureCache()
+
+
+def data_version(*values):
+    # Short content hash for small plotted inputs (Series, frames, arrays,
+    # dicts); large data should be keyed by its store or file version instead.
+    digest = hashlib.sha1()
+    for value in values:
+        if isinstance(value, (pd.Series, pd.DataFrame, pd.Index)):
+            digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+            digest.update(repr(getattr(value, "name", None)).encode())
+        elif hasattr(value, "tobytes"):
+            digest.update(value.tobytes())
+        else:
+            digest.update(repr(value).encode())
+    return digest.hexdigest()[:16]
+
+
+def render_figure(draw, figsize, image_format="png"):
+    # Figures are built without pyplot, so nothing is left in its global
+    # figure registry; the Figure is dropped as soon as it is encoded.
+    fig = Figure(figsize=figsize)
+    try:
+        with profiling.span("draw", "render"):
+            draw(fig)
+        buffer = io.BytesIO()
+        with profiling.span("savefig", "render"):
+            fig.savefig(buffer, format=image_format, dpi=DPI, bbox_inches="tight")
+        return buffer.getvalue()
+    finally:
+        fig.clf()
+
+
+def show(key, draw, figsize=(8, 4), image_format="png"):
+    # key must capture everything the chart depends on: chart type, data
+    # version and widget inputs. draw(fig) only runs on a cache miss.
+    key = (key, tuple(figsize), image_format)
+    data = CACHE.get(key)
+    if data is None:
+        data = render_figure(draw, figsize, image_format)
+        CACHE.put(key, data)
+    if image_format == "svg":
+        st.image(data.decode("utf-8"))
+    else:
+        st.image(data)
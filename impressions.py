@@ -0,0 +1,124 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from preprocess import DATA_DIR, iter_table_batches
+from dictionary import Dictionary
+
+BATCH_ROWS = 65536
+# Positions past this are pooled into the last bucket of the position curve.
+MAX_POSITION = 300
+
+
+def aggregates_path():
+    return os.path.join(DATA_DIR, "ctr.npz")
+
+
+def parse_impressions(impressions, news_index):
+    # "N1-1 N2-0 ..." -> flat arrays of (row within the batch, news code,
+    # label, list position). Unlabelled test-split tokens get label -1.
+    tokens = impressions.fillna("").str.split()
+    lengths = tokens.str.len().to_numpy()
+    flat = tokens.explode().dropna()
+    has_label = flat.str[-2] == "-"
+    news_ids = flat.where(~has_label, flat.str[:-2])
+    labels = np.where(has_label, flat.str[-1] == "1", -1).astype(np.int8)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    positions = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return rows, news_index.get_indexer(news_ids.to_numpy()), labels, positions
+
+
+def empty_ctr(news_dictionary, user_dictionary):
+    # Per-news arrays cover the news table (dictionary codes below base), so
+    # they line up with news.parquet rows; per-user arrays cover every user code.
+    n_news, n_users = news_dictionary.base, len(user_dictionary)
+    return {"news_shown": np.zeros(n_news, dtype=np.int64), "news_clicks": np.zeros(n_news, dtype=np.int64),
+            "position_shown": np.zeros(MAX_POSITION + 1, dtype=np.int64),
+            "position_clicks": np.zeros(MAX_POSITION + 1, dtype=np.int64),
+            "user_sessions": np.zeros(n_users, dtype=np.int64), "user_shown": np.zeros(n_users, dtype=np.int64),
+            "unknown_news": np.zeros(1, dtype=np.int64)}
+
+
+def ctr_partial(frame, news_dictionary, user_dictionary):
+    # Counts of one batch of behaviors; any set of batches merges with merge_ctr.
+    state = empty_ctr(news_dictionary, user_dictionary)
+    n_news, n_users = len(state["news_shown"]), len(state["user_sessions"])
+    rows, news, labels, positions = parse_impressions(frame["Impressions"], news_dictionary.values)
+    known = (news >= 0) & (news < n_news)
+    clicked = (labels == 1).astype(np.int64)
+    state["news_shown"] += np.bincount(news[known], minlength=n_news)
+    state["news_clicks"] += np.bincount(news[known], weights=clicked[known], minlength=n_news).astype(np.int64)
+    state["unknown_news"] += int((~known).sum())
+
+    bucket = np.minimum(positions, MAX_POSITION)
+    state["position_shown"] += np.bincount(bucket, minlength=MAX_POSITION + 1)
+    state["position_clicks"] += np.bincount(bucket, weights=clicked, minlength=MAX_POSITION + 1).astype(np.int64)
+
+    codes = user_dictionary.encode(frame["User ID"].astype(str))
+    state["user_sessions"] += np.bincount(codes, minlength=n_users)
+    state["user_shown"] += np.bincount(codes[rows], minlength=n_users)
+    return state
+
+
+def merge_ctr(state, partial):
+    # Codes are append-only, so a shorter array is a prefix of the longer one.
+    merged = {}
+    for key, values in partial.items():
+        size = max(len(state[key]), len(values))
+        merged[key] = np.pad(state[key], (0, size - len(state[key]))) + np.pad(values, (0, size - len(values)))
+    return merged
+
+
+def save_ctr(state, **extra):
+    path = aggregates_path()
+    np.savez(path + ".tmp.npz", **state, **extra)
+    os.replace(path + ".tmp.npz", path)
+
+
+def build_ctr_aggregates(batch_rows=BATCH_ROWS):
+    news_dictionary, user_dictionary = Dictionary("news"), Dictionary("user")
+    state = empty_ctr(news_dictionary, user_dictionary)
+    for batch in iter_table_batches("behaviors", ["User ID", "Impressions"], batch_rows):
+        state = merge_ctr(state, ctr_partial(batch.to_pandas(), news_dictionary, user_dictionary))
+    save_ctr(state)
+    impressions, clicks = int(state["news_shown"].sum()), int(state["news_clicks"].sum())
+    print(f"CTR aggregates built: {impressions} impressions, {clicks} clicks")
+    return {"impressions": impressions, "clicks": clicks, "unknown_news": int(state["unknown_news"][0])}
+
+
+def _ctr(clicks, shown):
+    return np.divide(clicks, shown, out=np.zeros(len(shown), dtype=np.float64), where=shown > 0)
+
+
+class CTRAggregates:
+    def __init__(self):
+        with np.load(aggregates_path()) as data:
+            self.arrays = dict(data)
+        news_dictionary = Dictionary("news")
+        self.arrays["news_ids"] = np.asarray(news_dictionary.values[:news_dictionary.base])
+        self.arrays["user_ids"] = np.asarray(Dictionary("user").values)
+
+    def per_news(self, min_impressions=1):
+        frame = pd.DataFrame({"News ID": self.arrays["news_ids"], "Impressions": self.arrays["news_shown"],
+                              "Clicks": self.arrays["news_clicks"]})
+        frame["CTR"] = _ctr(frame["Clicks"].to_numpy(), frame["Impressions"].to_numpy())
+        return frame[frame["Impressions"] >= min_impressions]
+
+    def per_group(self, news, column):
+        # news must be in news.parquet row order, which is how news codes are assigned.
+        frame = pd.DataFrame({column: news[column].to_numpy(), "Impressions": self.arrays["news_shown"],
+                              "Clicks": self.arrays["news_clicks"]})
+        grouped = frame.groupby(column, observed=True)[["Impressions", "Clicks"]].sum()
+        grouped["CTR"] = _ctr(grouped["Clicks"].to_numpy(), grouped["Impressions"].to_numpy())
+        return grouped.sort_values("CTR", ascending=False)
+
+    def per_position(self):
+        shown, clicks = self.arrays["position_shown"], self.arrays["position_clicks"]
+        frame = pd.DataFrame({"Impressions": shown, "Clicks": clicks, "CTR": _ctr(clicks, shown)},
+                             index=pd.RangeIndex(1, len(shown) + 1, name="Position"))
+        return frame[frame["Impressions"] > 0]
+
+    def per_user(self):
+        return pd.DataFrame({"Sessions": self.arrays["user_sessions"], "Articles Shown": self.arrays["user_shown"]},
+                            index=pd.Index(self.arrays["user_ids"], name="User ID"))
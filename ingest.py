@@ -0,0 +1,244 @@
+import os
+import sys
+import glob
+import shutil
+import hashlib
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from preprocess import (DATA_DIR, DATASETS, build_derived, derived_inputs, file_checksum, inputs_checksum,
+                        load_manifest, save_manifest, table_dataset, table_path, write_partitions)
+
+SEGMENT_PREFIX = "segment"
+SEGMENT_KEY = "ingest_segment"
+# Copies of the merged states taken before a segment changes anything, so an
+# interrupted ingest can be rolled back instead of finished.
+SNAPSHOT_DIR = os.path.join(DATA_DIR, "ingest_snapshot")
+# Derived entries updated in place from each segment; everything downstream
+# of them is rebuilt by build_derived as usual, without reading behaviors.
+INCREMENTAL = ["dict_news_user", "user_history", "ctr", "behaviors_hourly", "user_store"]
+
+
+def segment_template(sequence):
+    return f"{SEGMENT_PREFIX}-{sequence:05d}-{{i}}.parquet"
+
+
+def remove_segment_files(sequence):
+    # Files a previous attempt at this sequence left in any Day partition;
+    # rewriting only replaces files of the same name.
+    prefix = segment_template(sequence).split("{")[0]
+    for path in glob.glob(os.path.join(table_path("behaviors"), "*", prefix + "*")):
+        os.remove(path)
+
+
+def state_files():
+    from dictionary import META_FILE, dictionary_path
+    from impressions import aggregates_path
+    from user_history import index_paths
+
+    return [dictionary_path("news"), dictionary_path("user"), META_FILE, index_paths()["matrix"],
+            aggregates_path(), table_path("behaviors_hourly")]
+
+
+def snapshot_states():
+    shutil.rmtree(SNAPSHOT_DIR, ignore_errors=True)
+    os.makedirs(SNAPSHOT_DIR)
+    for path in state_files():
+        if os.path.exists(path):
+            shutil.copy2(path, os.path.join(SNAPSHOT_DIR, os.path.basename(path)))
+
+
+def restore_states():
+    for path in state_files():
+        copy = os.path.join(SNAPSHOT_DIR, os.path.basename(path))
+        if os.path.exists(copy):
+            shutil.copy2(copy, path + ".tmp")
+            os.replace(path + ".tmp", path)
+
+
+def stored_max_impression_id():
+    # From the Parquet footers of the stored files.
+    highest = 0
+    for fragment in table_dataset("behaviors").get_fragments():
+        metadata = fragment.metadata
+        column = metadata.schema.to_arrow_schema().get_field_index("Impression ID")
+        for i in range(metadata.num_row_groups):
+            statistics = metadata.row_group(i).column(column).statistics
+            if statistics is None or not statistics.has_min_max:
+                values = fragment.to_table(columns=["Impression ID"])["Impression ID"].to_numpy()
+                highest = max(highest, int(values.max()) if len(values) else 0)
+                break
+            highest = max(highest, int(statistics.max))
+    return highest
+
+
+def read_segment(path, impression_offset):
+    # Impression IDs restart at 1 in every MIND file, so a segment's IDs are
+    # shifted past those already stored to keep them unique.
+    spec = DATASETS["behaviors"]
+    frame = pd.read_csv(path, sep="\t", names=spec["columns"], usecols=range(len(spec["columns"])),
+                        dtype=spec["dtypes"], quoting=3, encoding="utf-8")
+    frame = spec["prepare"](frame)
+    frame["Impression ID"] += impression_offset
+    return frame.reset_index(drop=True)
+
+
+def update_ctr(frame, checksum):
+    from dictionary import Dictionary
+    from impressions import aggregates_path, ctr_partial, merge_ctr, save_ctr
+
+    with np.load(aggregates_path()) as data:
+        state = dict(data)
+    if str(state.pop(SEGMENT_KEY, "")) != checksum:
+        state = merge_ctr(state, ctr_partial(frame, Dictionary("news"), Dictionary("user")))
+        save_ctr(state, **{SEGMENT_KEY: np.array(checksum)})
+    return {"impressions": int(state["news_shown"].sum()), "clicks": int(state["news_clicks"].sum()),
+            "unknown_news": int(state["unknown_news"][0])}
+
+
+def update_history(frame, checksum):
+    # A union, so merging the same segment twice changes nothing.
+    from scipy import sparse
+    from dictionary import Dictionary
+    from user_history import history_matrix, index_paths, merge_histories, save_history_index
+
+    matrix = merge_histories(sparse.load_npz(index_paths()["matrix"]),
+                             history_matrix(frame, Dictionary("news"), Dictionary("user")))
+    save_history_index(matrix)
+    return {"users": int(matrix.shape[0]), "news": int(matrix.shape[1]), "clicks": int(matrix.nnz)}
+
+
+def update_hourly(frame, checksum):
+    from time_index import hourly_partial, merge_hourly, save_hourly
+
+    table = pq.read_table(table_path("behaviors_hourly"))
+    hourly = table.to_pandas()
+    if (table.schema.metadata or {}).get(SEGMENT_KEY.encode(), b"").decode() != checksum:
+        hourly = merge_hourly(hourly, *hourly_partial(frame))
+        save_hourly(hourly, **{SEGMENT_KEY: checksum})
+    return {"rows": int(len(hourly))}
+
+
+def update_user_store(frame, checksum, entry):
+    from dictionary import Dictionary
+    from user_store import append_sessions
+
+    appended = append_sessions(frame, checksum)
+    return {"sessions": entry.get("sessions", 0) + appended, "users": len(Dictionary("user"))}
+
+
+def start_segment(path, checksum, entry):
+    # Recorded in the manifest before anything changes: the segment's
+    # sequence and ID offset are fixed from here on, and no other file is
+    # ingested until this one is finished or rolled back.
+    from dictionary import Dictionary
+
+    sequence = len(entry.get("segments", [])) + 1
+    remove_segment_files(sequence)
+    snapshot_states()
+    return {"source": path, "checksum": checksum, "sequence": sequence,
+            "impression_offset": stored_max_impression_id(), "users": len(Dictionary("user"))}
+
+
+def ingest_segment(path, manifest):
+    # Each step is safe to repeat: the segment's partition files are removed
+    # and rewritten, the dictionaries and history index only gain what is
+    # missing, and the additive CTR, hourly and user store states record the
+    # checksum of the segment they merged last. The manifest marks the
+    # segment pending before the first change and complete after the last.
+    from dictionary import extend_news_user_dictionaries
+
+    checksum = file_checksum(path)
+    entry = manifest["behaviors"]
+    segments = entry.get("segments", [])
+    if any(segment["checksum"] == checksum for segment in segments):
+        print(f"{path} was already ingested, skipping")
+        return None
+    pending = entry.get("pending")
+    if pending is None:
+        pending = entry["pending"] = start_segment(path, checksum, entry)
+        save_manifest(manifest)
+    elif pending["checksum"] != checksum:
+        sys.exit(f"the ingest of {pending['source']} was interrupted; rerun it or run ingest.py --rollback "
+                 f"before ingesting {path}")
+    else:
+        print(f"resuming the interrupted ingest of {path}")
+    sequence, offset = pending["sequence"], pending["impression_offset"]
+    frame = read_segment(path, offset)
+    watermark = entry.get("watermark", {})
+    if len(frame) and frame["Time"].min() <= watermark.get("time", -1):
+        print(f"{path} starts before the watermark; its hours are merged with the stored ones")
+
+    remove_segment_files(sequence)
+    write_partitions(pa.Table.from_pandas(frame, preserve_index=False), table_path("behaviors"),
+                     DATASETS["behaviors"]["partition_by"], segment_template(sequence), "overwrite_or_ignore")
+    results = {"dict_news_user": extend_news_user_dictionaries(frame)}
+    for name, update in [("user_history", update_history), ("ctr", update_ctr),
+                         ("behaviors_hourly", update_hourly)]:
+        if name in manifest:
+            results[name] = update(frame, checksum)
+    if "user_store" in manifest:
+        results["user_store"] = update_user_store(frame, checksum, manifest["user_store"])
+
+    entry.setdefault("source_checksum", entry["checksum"])
+    entry["checksum"] = hashlib.sha1(f"{entry['checksum']}:{checksum}".encode()).hexdigest()
+    entry["rows"] += len(frame)
+    last_time = int(frame["Time"].max()) if len(frame) else watermark.get("time", 0)
+    segments.append({"source": path, "checksum": checksum, "rows": len(frame), "impression_offset": offset,
+                     "first_time": int(frame["Time"].min()) if len(frame) else None, "last_time": last_time})
+    entry["segments"] = segments
+    entry["watermark"] = {"sequence": sequence, "time": max(last_time, watermark.get("time", last_time)),
+                          "impression_id": int(frame["Impression ID"].max()) if len(frame) else offset}
+    del entry["pending"]
+    for name in INCREMENTAL:
+        if name in manifest:
+            inputs = derived_inputs(manifest, name)
+            manifest[name].update(results.get(name, {}), inputs=inputs, checksum=inputs_checksum(inputs))
+    save_manifest(manifest)
+    shutil.rmtree(SNAPSHOT_DIR, ignore_errors=True)
+    print(f"{path} ingested as segment {sequence}: {len(frame)} impressions")
+    return entry["watermark"]
+
+
+def rollback(manifest):
+    # Undoes an interrupted ingest: the merged states come back from the
+    # snapshot and the segment's files and user store rows are removed.
+    pending = manifest["behaviors"].get("pending")
+    if pending is None:
+        print("no interrupted ingest to roll back")
+        return None
+    restore_states()
+    remove_segment_files(pending["sequence"])
+    if "user_store" in manifest:
+        from user_store import remove_sessions
+
+        remove_sessions(pending["checksum"], pending["impression_offset"], pending["users"])
+    del manifest["behaviors"]["pending"]
+    save_manifest(manifest)
+    shutil.rmtree(SNAPSHOT_DIR, ignore_errors=True)
+    print(f"rolled back the interrupted ingest of {pending['source']}")
+    return pending
+
+
+def ingest(paths, roll_back=False):
+    manifest = load_manifest()
+    if "behaviors" not in manifest:
+        sys.exit("run preprocess.py first")
+    if roll_back:
+        rollback(manifest)
+    for path in paths:
+        ingest_segment(path, manifest)
+    return build_derived(manifest)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append new behaviors.tsv segments without reprocessing old data.")
+    parser.add_argument("segments", nargs="*", help="behaviors.tsv files in the order they were logged")
+    parser.add_argument("--rollback", action="store_true",
+                        help="undo an interrupted ingest before ingesting the given segments")
+    args = parser.parse_args()
+    ingest(args.segments, args.rollback)
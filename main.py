@@ -1,5 +1,18 @@
+import importlib
+
 import streamlit as st
-import overview, behaviors_news, entity_analysis, relation_analysis
+
+import profiling
+
+# Page modules pull in sklearn, seaborn, plotly and wordcloud, so they are
+# imported only when their page is opened; the card menu needs none of them.
+PAGES = {
+    "Overview": "overview",
+    "Behavior-News": "behaviors_news",
+    "Entity Analysis": "entity_analysis",
+    "Relation Analysis": "relation_analysis",
+    "User Profile": "user_profile",
+}
 
 st.set_page_config(page_title="MIND Dashboard", page_icon="📰", layout="centered")
 
@@ -88,6 +101,8 @@ def navigate_to(page_name):
 if "current_page" not in st.session_state:
     st.session_state.current_page = "Main"
 
+profile = profiling.ENABLED or st.query_params.get("profile") == "1"
+
 
 st.markdown("<div class='main-container'>", unsafe_allow_html=True)
 
@@ -111,30 +126,24 @@ if st.session_state.current_page == "Main":
     if st.button("🔗 Relation Analysis: Connections", key="relation_analysis"):
         navigate_to("Relation Analysis")
 
-    st.markdown("</div>", unsafe_allow_html=True)
-
-elif st.session_state.current_page == "Overview":
-    overview.render()
-    if st.button("Back to Main"):
-        navigate_to("Main")
-
-
-elif st.session_state.current_page == "Behavior-News":
-    behaviors_news.render()
-    if st.button("Back to Main"):
-        navigate_to("Main")
-
-
-elif st.session_state.current_page == "Entity Analysis":
-    entity_analysis.render()
-    if st.button("Back to Main"):
-        navigate_to("Main")
+    if st.button("👤 User Profile: Single-User Drill-Down", key="user_profile"):
+        navigate_to("User Profile")
 
+    st.markdown("</div>", unsafe_allow_html=True)
 
-elif st.session_state.current_page == "Relation Analysis":
-    relation_analysis.render()
+elif st.session_state.current_page in PAGES:
+    profiling.start_run(st.session_state.current_page, profile)
+    try:
+        with profiling.span("import", "load"):
+            page = importlib.import_module(PAGES[st.session_state.current_page])
+        page.render()
+    finally:
+        profiling.finish_run(profiling.session_history(st.session_state))
     if st.button("Back to Main"):
         navigate_to("Main")
 
 
 st.markdown("</div>", unsafe_allow_html=True)
+
+if profile:
+    profiling.render_panel(profiling.session_history(st.session_state))
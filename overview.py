@@ -1,5 +1,7 @@
 import streamlit as st
-import pandas as pd
+
+import data_loader
+import profiling
 
 def render():
     
@@ -21,25 +23,29 @@ def render():
     st.header("📂 Dataset Information")
     
     
+    profiling.section("Behaviors Data")
     st.write("### 👤 Behaviors Data")
-    behaviors = pd.read_csv("data/behaviors.csv")
-    st.dataframe(behaviors.head())
+    behaviors_rows, behaviors_preview = data_loader.table_info("behaviors")
+    st.dataframe(behaviors_preview)
     st.markdown("""
-    #### Attributes in `behaviors.csv` 📋
+    #### Attributes in the `behaviors/` dataset 📋
+    The table is split into one Parquet partition per calendar day (`Day=YYYY-MM-DD`), sorted by time within each day, so time-range queries only read the days they cover.
     - **🆔 Impression ID**: Unique identifier for each session where a user interacted with displayed articles. This helps group related user interactions.
     - **👥 User ID**: An anonymized ID for each user. This links interactions across multiple sessions while preserving privacy.
-    - **⏰ Time**: Timestamp of the session. Useful for understanding temporal patterns in user behavior.
+    - **⏰ Time**: Timestamp of the session, stored as seconds since the Unix epoch (MIND times carry no time zone). Useful for understanding temporal patterns in user behavior.
     - **🕵️‍♀️ History**: List of previously clicked articles by the user, ordered by time. This attribute is crucial for modeling user preferences.
     - **📑 Impressions**: Contains the list of displayed articles in the session and indicates whether each article was clicked (1 for clicked, 0 for not clicked). It is the primary source for training recommendation models.
+    - **📅 Day**: The partition the session belongs to, derived from its time.
     """)
-    st.write(f"📊 **Total Rows:** {len(behaviors)}")
+    st.write(f"📊 **Total Rows:** {behaviors_rows}")
     
     
+    profiling.section("News Data")
     st.write("### 📰 News Data")
-    news = pd.read_csv("data/news.csv")
-    st.dataframe(news.head())
+    news_rows, news_preview = data_loader.table_info("news")
+    st.dataframe(news_preview)
     st.markdown("""
-    #### Attributes in `news.csv` 📋
+    #### Attributes in `news.parquet` 📋
     - **🆔 News ID**: Unique identifier for each news article. Links news metadata with user behavior data.
     - **📂 Category**: High-level thematic classification of the news (e.g., Sports, Politics).
     - **📄 SubCategory**: More specific classification under the main category (e.g., Football under Sports).
@@ -48,14 +54,15 @@ def render():
     - **🔍 Title Entities**: Named entities in the title, extracted using natural language processing techniques. Enhances semantic understanding of the article.
     - **🌐 Abstract Entities**: Named entities in the abstract, further enriching the semantic context.
     """)
-    st.write(f"📊 **Total Rows:** {len(news)}")
+    st.write(f"📊 **Total Rows:** {news_rows}")
 
     
+    profiling.section("Entity Embeddings")
     st.write("### 🌐 Entity Embeddings")
-    entities = pd.read_csv("data/entity_embedding.csv")
-    st.dataframe(entities.head())
+    entities = data_loader.embedding_store("entity_embedding")
+    st.dataframe(entities.frame(0, 5))
     st.markdown("""
-    #### Attributes in `entity_embedding.csv` 📋
+    #### Attributes in `entity_embedding.npy` 📋
     - **🆔 Entity ID**: Unique identifier for each entity derived from WikiData.
     - **📈 Embedding Vector**: A 100-dimensional vector representing the semantic meaning of the entity. These embeddings are used to incorporate external knowledge into recommendation models.
     
@@ -65,11 +72,12 @@ def render():
     """)
     st.write(f"📊 **Total Rows:** {len(entities)}")
 
+    profiling.section("Relation Embeddings")
     st.write("### 🔗 Relation Embeddings")
-    relations = pd.read_csv("data/relation_embedding.csv")
-    st.dataframe(relations.head())
+    relations = data_loader.embedding_store("relation_embedding")
+    st.dataframe(relations.frame(0, 5))
     st.markdown("""
-    #### Attributes in `relation_embedding.csv` 📋
+    #### Attributes in `relation_embedding.npy` 📋
     - **🆔 Relation ID**: Unique identifier for each relationship derived from WikiData.
     - **📈 Embedding Vector**: A 100-dimensional vector representing the semantic meaning of the relationship.
 
@@ -1,16 +1,223 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Overridable so benchmarks can point the pipeline at generated data.
+RAW_DIR = os.environ.get("MIND_RAW_DIR", "MINDsmall_train")
+DATA_DIR = os.environ.get("MIND_DATA_DIR", "data")
+MANIFEST_FILE = os.path.join(DATA_DIR, "manifest.json")
+ROW_GROUP_SIZE = 65536
+
+DIM_COLUMNS = [f"Dim_{i}" for i in range(1, 101)]
+TIME_FORMAT = "%m/%d/%Y %I:%M:%S %p"
+
+
+def prepare_behaviors(data):
+    # MIND timestamps carry no zone; they are stored as naive epoch seconds
+    # and the table is partitioned by calendar day, sorted by time within it.
+    time = pd.to_datetime(data["Time"], format=TIME_FORMAT)
+    data["Time"] = (time - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)
+    data["Day"] = time.dt.strftime("%Y-%m-%d")
+    return data.sort_values("Time", kind="stable")
+
+
+DATASETS = {
+    "behaviors": {
+        "source": "behaviors.tsv",
+        "columns": ["Impression ID", "User ID", "Time", "History", "Impressions"],
+        "dtypes": {"Impression ID": "int64", "User ID": "string", "Time": "string",
+                   "History": "string", "Impressions": "string"},
+        "prepare": prepare_behaviors,
+        "partition_by": "Day",
+    },
+    "news": {
+        "source": "news.tsv",
+        "columns": ["News ID", "Category", "SubCategory", "Title", "Abstract", "URL",
+                    "Title Entities", "Abstract Entities"],
+        "dtypes": {"News ID": "string", "Category": "category", "SubCategory": "category",
+                   "Title": "string", "Abstract": "string", "URL": "string",
+                   "Title Entities": "string", "Abstract Entities": "string"},
+    },
+    "entity_embedding": {
+        "source": "entity_embedding.vec",
+        "columns": ["Entity ID"] + DIM_COLUMNS,
+        "embedding": True,
+    },
+    "relation_embedding": {
+        "source": "relation_embedding.vec",
+        "columns": ["Relation ID"] + DIM_COLUMNS,
+        "embedding": True,
+    },
+}
+
+# Indexes built from the converted tables; each is rebuilt only when the
+# checksum of one of its inputs or its format version changes.
+DERIVED = {
+    "dict_news_user": {"inputs": ["behaviors", "news"], "builder": "dictionary.build_news_user_dictionaries"},
+    "dict_entity": {"inputs": ["news", "entity_embedding"], "builder": "dictionary.build_entity_dictionary"},
+    "dict_relation": {"inputs": ["relation_embedding"], "builder": "dictionary.build_relation_dictionary"},
+    "user_history": {"inputs": ["behaviors", "dict_news_user"], "builder": "user_history.build_history_index"},
+    "token_counts": {"inputs": ["news"], "builder": "token_index.build_token_index", "version": 2},
+    "ctr": {"inputs": ["behaviors", "dict_news_user"], "builder": "impressions.build_ctr_aggregates"},
+    "behaviors_hourly": {"inputs": ["behaviors"], "builder": "time_index.build_hourly_activity"},
+    "entity_index": {"inputs": ["news", "entity_embedding", "dict_entity"], "builder": "entity_index.build_entity_index"},
+    "coclick": {"inputs": ["user_history"], "builder": "coclick.build_coclick_matrix"},
+    "user_store": {"inputs": ["behaviors", "dict_news_user"], "builder": "user_store.build_user_store"},
+    "entity_similarity": {"inputs": ["entity_embedding"], "builder": "similarity.build_entity_index"},
+}
+
+
+def table_path(name):
+    if DATASETS.get(name, {}).get("partition_by"):
+        return os.path.join(DATA_DIR, name)
+    return os.path.join(DATA_DIR, f"{name}.parquet")
+
+
+def table_dataset(name):
+    return ds.dataset(table_path(name), format="parquet", partitioning="hive")
+
+
+def iter_table_batches(name, columns, batch_rows=ROW_GROUP_SIZE, filter_expression=None):
+    batches = table_dataset(name).to_batches(columns=columns, batch_size=batch_rows, filter=filter_expression)
+    for batch in batches:
+        if batch.num_rows:
+            yield batch
+
+
+def file_checksum(path, block_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        return {}
+    with open(MANIFEST_FILE, encoding="utf-8") as f:
+        return json.load(f)
 
-def preprocess_tsv_to_csv(input_file, output_file, column_names):
-    data = pd.read_csv(input_file, sep='\t', names=column_names, quoting=3, encoding='utf-8')
-    data.to_csv(output_file, index=False)
+
+def save_manifest(manifest):
+    tmp_file = MANIFEST_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, MANIFEST_FILE)
+
+
+def write_partitions(table, output_dir, partition_by, basename_template="part-{i}.parquet",
+                     existing_data_behavior="error"):
+    ds.write_dataset(table, output_dir, format="parquet", partitioning=[partition_by],
+                     partitioning_flavor="hive", basename_template=basename_template,
+                     existing_data_behavior=existing_data_behavior,
+                     max_rows_per_group=ROW_GROUP_SIZE, min_rows_per_group=min(ROW_GROUP_SIZE, 4096),
+                     file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"))
+
+
+def preprocess_tsv_to_parquet(input_file, output_file, column_names, dtypes, prepare=None, partition_by=None):
+    # The .vec files end every line with a trailing tab, so only the named
+    # columns are read; otherwise pandas shifts the ID column into the index.
+    data = pd.read_csv(input_file, sep="\t", names=column_names, usecols=range(len(column_names)),
+                       dtype=dtypes, quoting=3, encoding="utf-8")
+    if prepare is not None:
+        data = prepare(data)
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    tmp_file = output_file + ".tmp"
+    if partition_by:
+        shutil.rmtree(tmp_file, ignore_errors=True)
+        write_partitions(table, tmp_file, partition_by)
+        shutil.rmtree(output_file, ignore_errors=True)
+    else:
+        pq.write_table(table, tmp_file, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+    os.replace(tmp_file, output_file)
     print(f"{input_file} has been converted to {output_file}")
+    return len(data)
+
+
+def _convert(name, source_file, checksum):
+    spec = DATASETS[name]
+    if spec.get("embedding"):
+        from embedding_store import build_embedding_store, store_paths
+
+        output_file = store_paths(name)["vectors"]
+        rows = build_embedding_store(source_file, name, spec["columns"][0], checksum)["rows"]
+    else:
+        output_file = table_path(name)
+        rows = preprocess_tsv_to_parquet(source_file, output_file, spec["columns"], spec["dtypes"],
+                                         spec.get("prepare"), spec.get("partition_by"))
+    return name, {"source": source_file, "checksum": checksum, "output": output_file,
+                  "rows": rows, "columns": spec["columns"]}
+
+
+def preprocess_all(names=None, force=False):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    manifest = load_manifest()
+    jobs = []
+    for name in names or DATASETS:
+        source_file = os.path.join(RAW_DIR, DATASETS[name]["source"])
+        if not os.path.exists(source_file):
+            print(f"{source_file} not found, skipping")
+            continue
+        checksum = file_checksum(source_file)
+        entry = manifest.get(name, {})
+        # After ingest.py appends segments, "checksum" covers them too and the
+        # raw file is compared against "source_checksum". Reconverting a
+        # changed source drops the ingested segments.
+        source_checksum = entry.get("source_checksum", entry.get("checksum"))
+        if not force and source_checksum == checksum and os.path.exists(entry.get("output", "")):
+            print(f"{source_file} is unchanged, skipping")
+            continue
+        jobs.append((name, source_file, checksum))
+
+    if jobs:
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            for name, entry in pool.map(_convert, *zip(*jobs)):
+                manifest[name] = entry
+        save_manifest(manifest)
+    return build_derived(manifest, force)
+
+
+def inputs_checksum(inputs):
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def derived_inputs(manifest, name):
+    spec = DERIVED[name]
+    inputs = {dep: manifest.get(dep, {}).get("checksum") for dep in spec["inputs"]}
+    if "version" in spec:
+        inputs["version"] = spec["version"]
+    return inputs
+
+
+def build_derived(manifest, force=False):
+    for name, spec in DERIVED.items():
+        inputs = derived_inputs(manifest, name)
+        if None in inputs.values():
+            print(f"{name} is missing inputs, skipping")
+            continue
+        if not force and manifest.get(name, {}).get("inputs") == inputs:
+            print(f"{name} is up to date, skipping")
+            continue
+        module_name, func_name = spec["builder"].rsplit(".", 1)
+        builder = getattr(importlib.import_module(module_name), func_name)
+        checksum = inputs_checksum(inputs)
+        start = time.perf_counter()
+        result = builder() or {}
+        manifest[name] = {"inputs": inputs, "checksum": checksum, "seconds": round(time.perf_counter() - start, 3),
+                          **result}
+        save_manifest(manifest)
+    return manifest
+
 
 if __name__ == "__main__":
-    preprocess_tsv_to_csv("MINDsmall_train/behaviors.tsv", "data/behaviors.csv", 
-                          ["Impression ID", "User ID", "Time", "History", "Impressions"])
-    preprocess_tsv_to_csv("MINDsmall_train/news.tsv", "data/news.csv", 
-                          ["News ID", "Category", "SubCategory", "Title", "Abstract", "URL", "Title Entities", "Abstract Entities"])
-    preprocess_tsv_to_csv("MINDsmall_train/entity_embedding.vec", "data/entity_embedding.csv", 
-                          ["Entity ID"] + [f"Dim_{i}" for i in range(1, 101)])
-    preprocess_tsv_to_csv("MINDsmall_train/relation_embedding.vec", "data/relation_embedding.csv", 
-                          ["Relation ID"] + [f"Dim_{i}" for i in range(1, 101)])
+    preprocess_all()
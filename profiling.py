@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import functools
+import threading
+from collections import deque
+from contextlib import nullcontext
+
+# Profiling is off unless MIND_PROFILE=1 or the page is opened with
+# ?profile=1. Without an active run, span() hands back a shared no-op
+# context manager and timed() calls straight through.
+ENABLED = os.environ.get("MIND_PROFILE") == "1"
+MAX_RUNS = 20
+SESSION_KEY = "profiling_runs"
+
+_NULL_SPAN = nullcontext()
+_local = threading.local()
+
+
+@functools.lru_cache(maxsize=1)
+def _process():
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process()
+
+
+def _rss():
+    process = _process()
+    return None if process is None else process.memory_info().rss
+
+
+class Run:
+    def __init__(self, page):
+        self.page = page
+        self.started = time.time()
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.stack = []
+        self.section = None
+
+    def open(self, name, kind):
+        span = {"name": name, "kind": kind, "depth": len(self.stack),
+                "start_ms": (time.perf_counter() - self.origin) * 1000, "rss_start": _rss()}
+        self.spans.append(span)
+        self.stack.append(span)
+        return span
+
+    def close(self, span):
+        span["ms"] = (time.perf_counter() - self.origin) * 1000 - span["start_ms"]
+        rss_start, rss_end = span.pop("rss_start"), _rss()
+        span["rss_delta"] = None if rss_start is None or rss_end is None else rss_end - rss_start
+        while self.stack and self.stack.pop() is not span:
+            pass
+
+    def to_dict(self):
+        return {"page": self.page, "started": self.started, "total_ms": (time.perf_counter() - self.origin) * 1000,
+                "spans": [span for span in self.spans if "ms" in span]}
+
+
+class _Span:
+    def __init__(self, run, name, kind):
+        self.run, self.name, self.kind = run, name, kind
+
+    def __enter__(self):
+        self.span = self.run.open(self.name, self.kind)
+        return self.span
+
+    def __exit__(self, *exc_info):
+        self.run.close(self.span)
+        return False
+
+
+def current_run():
+    return getattr(_local, "run", None)
+
+
+def span(name, kind="compute"):
+    run = current_run()
+    return _NULL_SPAN if run is None else _Span(run, name, kind)
+
+
+def section(name):
+    # Ends the previous top-level section of the page and starts the next one,
+    # so a page only needs one call per header.
+    run = current_run()
+    if run is None:
+        return
+    if run.section is not None:
+        run.close(run.section)
+    run.section = run.open(name, "section")
+
+
+def timed(name=None, kind="load"):
+    def decorator(function):
+        label = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            run = current_run()
+            if run is None:
+                return function(*args, **kwargs)
+            with _Span(run, label, kind):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_run(page, enabled=ENABLED):
+    _local.run = Run(page) if enabled else None
+    return _local.run
+
+
+def finish_run(history):
+    run, _local.run = current_run(), None
+    if run is None:
+        return None
+    if run.section is not None:
+        run.close(run.section)
+    record = run.to_dict()
+    history.append(record)
+    return record
+
+
+def session_history(session_state, max_runs=MAX_RUNS):
+    if SESSION_KEY not in session_state:
+        session_state[SESSION_KEY] = deque(maxlen=max_runs)
+    return session_state[SESSION_KEY]
+
+
+def to_json(runs):
+    return json.dumps(list(runs), indent=2)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_openmetrics(runs):
+    # Span durations become a summary per (page, span, kind) over the retained
+    # reruns; RSS growth is reported for the latest rerun only.
+    totals = {}
+    for run in runs:
+        for span in run["spans"]:
+            key = (run["page"], span["name"], span["kind"])
+            count, seconds = totals.get(key, (0, 0.0))
+            totals[key] = (count + 1, seconds + span["ms"] / 1000)
+    lines = ["# TYPE mind_span_seconds summary", "# UNIT mind_span_seconds seconds",
+             "# HELP mind_span_seconds Time spent in instrumented dashboard sections."]
+    for (page, name, kind), (count, seconds) in totals.items():
+        labels = f'page="{_label(page)}",span="{_label(name)}",kind="{_label(kind)}"'
+        lines.append(f"mind_span_seconds_count{{{labels}}} {count}")
+        lines.append(f"mind_span_seconds_sum{{{labels}}} {seconds:.6f}")
+    lines += ["# TYPE mind_span_rss_delta_bytes gauge",
+              "# HELP mind_span_rss_delta_bytes Resident memory growth across a span in the latest rerun."]
+    for span in (runs[-1]["spans"] if runs else []):
+        if span["rss_delta"] is not None:
+            labels = f'page="{_label(runs[-1]["page"])}",span="{_label(span["name"])}",kind="{_label(span["kind"])}"'
+            lines.append(f"mind_span_rss_delta_bytes{{{labels}}} {span['rss_delta']}")
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def render_panel(runs, max_rows=MAX_RUNS):
+    import streamlit as st
+    import pandas as pd
+
+    runs = list(runs)[-max_rows:]
+    with st.sidebar.expander("⏱️ Profiling", expanded=False):
+        if not runs:
+            st.write("No profiled reruns yet.")
+            return
+        st.dataframe(pd.DataFrame({
+            "Page": [run["page"] for run in runs],
+            "Started": pd.to_datetime([run["started"] for run in runs], unit="s").strftime("%H:%M:%S"),
+            "Total ms": [round(run["total_ms"], 1) for run in runs],
+        }).iloc[::-1], hide_index=True)
+        latest = pd.DataFrame(runs[-1]["spans"])
+        if len(latest):
+            latest["name"] = ["  " * depth + name for depth, name in zip(latest["depth"], latest["name"])]
+            latest["RSS Δ MB"] = latest["rss_delta"].astype(float) / 2**20
+            st.write(f"**Latest rerun: {runs[-1]['page']}**")
+            st.dataframe(latest[["name", "kind", "ms", "RSS Δ MB"]].round(2), hide_index=True)
+        st.download_button("Export JSON", to_json(runs), "profile.json", "application/json")
+        st.download_button("Export OpenMetrics", to_openmetrics(runs), "profile.txt",
+                           "application/openmetrics-text; version=1.0.0; charset=utf-8")
@@ -0,0 +1,101 @@
+import os
+
+import numpy as np
+from sklearn.decomposition import IncrementalPCA
+
+from preprocess import DATA_DIR
+
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+MAX_COMPONENTS = 10
+CHUNK_ROWS = 65536
+
+
+def cache_paths(store, max_components, cache_dir=CACHE_DIR):
+    base = os.path.join(cache_dir, f"pca_{store.name}_{store.version[:16]}_{max_components}")
+    return {"model": base + ".npz", "coords": base + ".npy"}
+
+
+def iter_chunks(n_rows, chunk_rows, min_rows=1):
+    # A short final chunk is folded into the previous one, because
+    # IncrementalPCA.partial_fit needs at least n_components rows per batch.
+    starts = list(range(0, n_rows, chunk_rows))
+    if len(starts) > 1 and n_rows - starts[-1] < min_rows:
+        starts.pop()
+    for i, start in enumerate(starts):
+        yield start, starts[i + 1] if i + 1 < len(starts) else n_rows
+
+
+def column_moments(vectors, chunk_rows=CHUNK_ROWS):
+    total = np.zeros(vectors.shape[1], dtype=np.float64)
+    total_sq = np.zeros(vectors.shape[1], dtype=np.float64)
+    for start, stop in iter_chunks(len(vectors), chunk_rows):
+        chunk = np.asarray(vectors[start:stop], dtype=np.float64)
+        total += chunk.sum(axis=0)
+        total_sq += np.square(chunk).sum(axis=0)
+    n_rows = len(vectors)
+    mean = total / max(n_rows, 1)
+    var = (total_sq - n_rows * np.square(mean)) / max(n_rows - 1, 1)
+    std = np.sqrt(np.maximum(var, 0))
+    return mean, np.where(std > 0, std, 1.0)
+
+
+class Projection:
+    def __init__(self, paths):
+        with np.load(paths["model"]) as model:
+            self.components = model["components"]
+            self.mean = model["mean"]
+            self.scale = model["scale"]
+            self.explained_variance_ratio = model["explained_variance_ratio"]
+        self.projected = np.load(paths["coords"], mmap_mode="r")
+
+    @property
+    def max_components(self):
+        return self.components.shape[0]
+
+    def coords(self, n_components):
+        if n_components > self.max_components:
+            raise ValueError(f"only {self.max_components} components are cached")
+        return self.projected[:, :n_components]
+
+    def transform(self, vectors, n_components=None):
+        components = self.components[:n_components or self.max_components]
+        return ((np.asarray(vectors, dtype=np.float32) - self.mean) / self.scale) @ components.T
+
+
+def fit_projection(store, max_components=MAX_COMPONENTS, chunk_rows=CHUNK_ROWS, cache_dir=CACHE_DIR):
+    vectors = store.vectors
+    max_components = min(max_components, store.dims, len(vectors))
+    paths = cache_paths(store, max_components, cache_dir)
+    mean, scale = column_moments(vectors, chunk_rows)
+    mean, scale = mean.astype(np.float32), scale.astype(np.float32)
+
+    # Rows are standardized chunk by chunk so the full matrix is never loaded.
+    pca = IncrementalPCA(n_components=max_components)
+    for start, stop in iter_chunks(len(vectors), chunk_rows, max_components):
+        pca.partial_fit((vectors[start:stop] - mean) / scale)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_coords = paths["coords"] + ".tmp"
+    projected = np.lib.format.open_memmap(tmp_coords, mode="w+", dtype=np.float32,
+                                          shape=(len(vectors), max_components))
+    for start, stop in iter_chunks(len(vectors), chunk_rows):
+        projected[start:stop] = pca.transform((vectors[start:stop] - mean) / scale)
+    projected.flush()
+    del projected
+
+    tmp_model = paths["model"] + ".tmp.npz"
+    np.savez(tmp_model, components=pca.components_.astype(np.float32), mean=mean, scale=scale,
+             explained_variance_ratio=pca.explained_variance_ratio_)
+    os.replace(tmp_coords, paths["coords"])
+    os.replace(tmp_model, paths["model"])
+    return Projection(paths)
+
+
+def load_projection(store, max_components=MAX_COMPONENTS, cache_dirs=(CACHE_DIR,)):
+    # The first directory holding a cached fit wins; otherwise the fit is
+    # written to the last one.
+    for cache_dir in cache_dirs:
+        paths = cache_paths(store, min(max_components, store.dims, len(store)), cache_dir)
+        if all(os.path.exists(path) for path in paths.values()):
+            return Projection(paths)
+    return fit_projection(store, max_components, cache_dir=cache_dirs[-1])
@@ -1,10 +1,11 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.decomposition import PCA
-from sklearn.cluster import KMeans
+
+import data_loader
+import figures
+import profiling
+from embedding_store import store_paths
 
 def render():
     
@@ -12,20 +13,23 @@ def render():
     st.markdown("Analyze and visualize relation embeddings in a fun and interactive way! 🚀")
 
     
-    csv_file_path = "data/relation_embedding.csv"
+    file_path = store_paths("relation_embedding")["vectors"]
     try:
         
+        profiling.section("Data Overview")
         st.header("📂 Data Overview")
-        df = pd.read_csv(csv_file_path)
+        store = data_loader.embedding_store("relation_embedding")
+        stats = data_loader.dimension_stats("relation_embedding")
         st.write("**Preview of the Data:**")
-        st.dataframe(df.head())
+        st.dataframe(store.frame(0, 5))
 
      
+        profiling.section("Exploratory Data Analysis")
         st.header("📊 Exploratory Data Analysis")
         
         
         st.subheader("📌 Five Number Summary")
-        summary = df.describe().T[['min', '25%', '50%', '75%', 'max']]
+        summary = stats.summary()
         st.write("**Five Number Summary:**")
         st.dataframe(summary)
 
@@ -42,19 +46,53 @@ def render():
         
         
         st.subheader("📊 Boxplot of Selected Embedding Dimension")
-        dimension_list = df.columns[1:]  
+        dimension_list = stats.columns
         selected_dimension = st.selectbox("Select Embedding Dimension for Boxplot:", dimension_list)
 
     
-        fig, ax = plt.subplots(figsize=(8, 4))
-        sns.boxplot(y=df[selected_dimension], ax=ax, color="skyblue")
-        ax.set_title(f"Boxplot of Embedding Dimension: {selected_dimension}")
-        ax.set_ylabel("Embedding Value")
-        st.pyplot(fig)
+        def draw_boxplot(fig):
+            ax = fig.subplots()
+            ax.bxp([stats.box(selected_dimension)], showfliers=False, patch_artist=True,
+                   boxprops={"facecolor": "skyblue"})
+            ax.set_title(f"Boxplot of Embedding Dimension: {selected_dimension}")
+            ax.set_ylabel("Embedding Value")
+
+        figures.show(("boxplot", store.version, selected_dimension), draw_boxplot, figsize=(8, 4))
+        st.write(f"**Outliers beyond 1.5 IQR:** {stats.summary(['outliers']).loc[selected_dimension, 'outliers']}")
+
+
+        profiling.section("Relation Clusters")
+        st.header("🧩 Relation Clusters")
+        n_clusters = st.slider("Number of clusters:", 2, 50, 20)
+        clusters = data_loader.clusters("relation_embedding", n_clusters)
+        st.write("**Cluster sizes and spread of distances to the centroid:**")
+        st.dataframe(data_loader.cluster_summary("relation_embedding", n_clusters).round(3))
+        selected_cluster = st.selectbox("Show relations closest to the centroid of cluster:", range(clusters.n_clusters))
+        members = clusters.members(selected_cluster, 20)
+        st.dataframe(pd.DataFrame({"Relation ID": store.id_at(members), "Distance": clusters.distances[members]}),
+                     hide_index=True)
+
+
+        profiling.section("Link Prediction")
+        st.header("🔮 Link Prediction")
+        st.markdown("Relations are TransE vectors: for a true triple (head, relation, tail), **head + relation ≈ tail**. "
+                    "The most plausible tails are the entities closest to head + relation.")
+        scorer = data_loader.triple_scorer()
+        head_input = st.text_input("Head entity IDs (e.g., `Q41, Q30`):", ", ".join(scorer.entities.id_at(slice(0, 1))))
+        head_ids = [entity_id.strip() for entity_id in head_input.split(",") if entity_id.strip()]
+        relation_id = st.selectbox("Relation:", store.id_at(slice(0, len(store))))
+        tail_k = st.slider("Tails per head:", 1, 50, 10)
+        if head_ids:
+            try:
+                with profiling.span("predict_tails"):
+                    tails = scorer.predict_tails(head_ids, [relation_id] * len(head_ids), tail_k)
+                st.dataframe(tails, hide_index=True)
+            except KeyError as e:
+                st.error(f"Unknown entity IDs: {e.args[0]}")
 
         
 
     except FileNotFoundError:
-        st.error(f"❌ File not found at path: {csv_file_path}. Please check the file location and try again.")
+        st.error(f"❌ File not found at path: {file_path}. Please check the file location and try again.")
 
 
@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from preprocess import DATA_DIR, load_manifest, table_path
+
+REPORT_DIR = os.path.join(DATA_DIR, "report")
+LATEST_FILE = os.path.join(REPORT_DIR, "latest.json")
+# Bumped whenever a stage changes what it writes, so old bundles are ignored.
+REPORT_FORMAT = 1
+WORD_CLOUD_WORDS = 200
+
+
+def _write_frame(frame, bundle_dir, name):
+    path = os.path.join(bundle_dir, f"{name}.parquet")
+    frame.to_parquet(path, compression="zstd")
+    return [os.path.basename(path)]
+
+
+def click_counts(bundle_dir):
+    from user_history import HistoryIndex
+
+    history = HistoryIndex()
+    files = _write_frame(history.popularity().rename("Users").to_frame(), bundle_dir, "click_counts")
+    return files + _write_frame(history.history_lengths().describe().to_frame().T, bundle_dir, "history_lengths")
+
+
+def category_counts(bundle_dir):
+    news = pd.read_parquet(table_path("news"), columns=["Category", "SubCategory"])
+    categories = news["Category"].value_counts().rename_axis("Category").reset_index(name="Count")
+    subcategories = news["SubCategory"].value_counts().rename("Count").to_frame()
+    return (_write_frame(categories, bundle_dir, "category_counts")
+            + _write_frame(subcategories, bundle_dir, "subcategory_counts"))
+
+
+def title_lengths(bundle_dir):
+    titles = pd.read_parquet(table_path("news"), columns=["Title"])["Title"]
+    lengths = titles.str.len().value_counts().sort_index().rename("Count").to_frame()
+    return _write_frame(lengths, bundle_dir, "title_lengths")
+
+
+def word_frequencies(bundle_dir):
+    from token_index import TEXT_FIELDS, token_frequencies
+
+    counts = pd.read_parquet(table_path("token_counts"))
+    frames = [pd.DataFrame(list(token_frequencies(counts, field, max_words=WORD_CLOUD_WORDS).items()),
+                           columns=["Token", "Count"]).assign(Field=field) for field in TEXT_FIELDS]
+    return _write_frame(pd.concat(frames, ignore_index=True), bundle_dir, "word_frequencies")
+
+
+def entity_projection(bundle_dir):
+    from embedding_store import EmbeddingStore
+    from projection import cache_paths, fit_projection
+
+    store = EmbeddingStore("entity_embedding")
+    projection = fit_projection(store, cache_dir=bundle_dir)
+    return [os.path.basename(path) for path in cache_paths(store, projection.max_components, bundle_dir).values()]
+
+
+def _embedding_stats(name, bundle_dir):
+    from embedding_store import EmbeddingStore
+    from dimension_stats import HIST_BINS, cache_path, save_stats
+
+    store = EmbeddingStore(name)
+    save_stats(store, HIST_BINS, bundle_dir)
+    return [os.path.basename(cache_path(store, HIST_BINS, bundle_dir))]
+
+
+def entity_stats(bundle_dir):
+    return _embedding_stats("entity_embedding", bundle_dir)
+
+
+def relation_stats(bundle_dir):
+    return _embedding_stats("relation_embedding", bundle_dir)
+
+
+def _clusters(name, bundle_dir):
+    from embedding_store import EmbeddingStore
+    from clustering import DEFAULT_CLUSTERS, cache_paths, fit_clusters
+
+    store = EmbeddingStore(name)
+    clusters = fit_clusters(store, DEFAULT_CLUSTERS, cache_dir=bundle_dir)
+    return [os.path.basename(path) for path in cache_paths(store, clusters.n_clusters, bundle_dir).values()]
+
+
+def entity_clusters(bundle_dir):
+    return _clusters("entity_embedding", bundle_dir)
+
+
+def relation_clusters(bundle_dir):
+    return _clusters("relation_embedding", bundle_dir)
+
+
+# Each stage is run by the function of the same name and lists the manifest
+# entries it reads; the pages only use a stage's artifacts while those
+# checksums still match the manifest.
+STAGES = {
+    "click_counts": ["user_history"],
+    "category_counts": ["news"],
+    "title_lengths": ["news"],
+    "word_frequencies": ["token_counts"],
+    "entity_projection": ["entity_embedding"],
+    "entity_stats": ["entity_embedding"],
+    "relation_stats": ["relation_embedding"],
+    "entity_clusters": ["entity_embedding"],
+    "relation_clusters": ["relation_embedding"],
+}
+
+
+def run_stage(name, bundle_dir):
+    start = time.perf_counter()
+    files = globals()[name](bundle_dir)
+    return name, time.perf_counter() - start, files
+
+
+def stage_inputs(manifest, name):
+    return {dep: manifest.get(dep, {}).get("checksum") for dep in STAGES[name]}
+
+
+def bundle_version(inputs):
+    payload = json.dumps({"format": REPORT_FORMAT, "inputs": inputs}, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def load_latest():
+    if not os.path.exists(LATEST_FILE):
+        return None
+    with open(LATEST_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def stage_dir(name, latest=None, manifest=None):
+    # Directory holding a stage's artifacts, or None when there is no bundle
+    # or it was built from inputs that have since changed.
+    latest = latest if latest is not None else load_latest()
+    if not latest or latest.get("format") != REPORT_FORMAT or name not in latest.get("stages", {}):
+        return None
+    manifest = manifest if manifest is not None else load_manifest()
+    if latest["stages"][name]["inputs"] != stage_inputs(manifest, name):
+        return None
+    return os.path.join(REPORT_DIR, latest["version"])
+
+
+def build_report(workers=None, force=False):
+    manifest = load_manifest()
+    inputs = {name: stage_inputs(manifest, name) for name in STAGES}
+    for name, checksums in list(inputs.items()):
+        if None in checksums.values():
+            print(f"{name} is missing inputs, skipping")
+            del inputs[name]
+    if not inputs:
+        raise SystemExit("nothing to report on; run preprocess.py first")
+
+    version = bundle_version(inputs)
+    bundle_dir = os.path.join(REPORT_DIR, version)
+    latest = load_latest()
+    if not force and os.path.isdir(bundle_dir) and latest and latest.get("version") == version:
+        print(f"report bundle {version} is up to date")
+        return latest
+
+    tmp_dir = bundle_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    stages = {}
+    started = time.perf_counter()
+    workers = workers or max(1, min(len(inputs), os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_stage, name, tmp_dir) for name in inputs]
+        for future in as_completed(futures):
+            name, seconds, files = future.result()
+            stages[name] = {"inputs": inputs[name], "seconds": round(seconds, 3), "files": files}
+            print(f"{name:<20} {seconds:8.2f}s")
+    wall = time.perf_counter() - started
+    print(f"{'total (wall)':<20} {wall:8.2f}s")
+
+    bundle = {"format": REPORT_FORMAT, "version": version, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "workers": workers, "wall_seconds": round(wall, 3),
+              "stages": {name: stages[name] for name in inputs}}
+    with open(os.path.join(tmp_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(bundle, f, indent=2, sort_keys=True)
+    shutil.rmtree(bundle_dir, ignore_errors=True)
+    os.replace(tmp_dir, bundle_dir)
+    with open(LATEST_FILE + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(bundle, f, indent=2, sort_keys=True)
+    os.replace(LATEST_FILE + ".tmp", LATEST_FILE)
+    print(f"report bundle written to {bundle_dir}")
+    return bundle
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute every dashboard aggregate into a report bundle.")
+    parser.add_argument("--workers", type=int, help="process pool size (default: one per stage, up to the CPU count)")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the bundle is up to date")
+    parser.add_argument("--preprocess", action="store_true", help="run preprocess.py first")
+    args = parser.parse_args(argv)
+    if args.preprocess:
+        from preprocess import preprocess_all
+
+        preprocess_all()
+    build_report(args.workers, args.force)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
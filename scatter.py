@@ -0,0 +1,64 @@
+import numpy as np
+
+from projection import CHUNK_ROWS, iter_chunks
+
+POINT_BUDGET = 5000
+GRID_BINS = 100
+
+
+def extent(coords, chunk_rows=CHUNK_ROWS):
+    low = np.full(coords.shape[1], np.inf)
+    high = np.full(coords.shape[1], -np.inf)
+    for start, stop in iter_chunks(len(coords), chunk_rows):
+        chunk = coords[start:stop]
+        low, high = np.minimum(low, chunk.min(axis=0)), np.maximum(high, chunk.max(axis=0))
+    return np.stack([low, high], axis=1)
+
+
+def _inside(chunk, bounds):
+    return np.all((chunk >= bounds[:, 0]) & (chunk <= bounds[:, 1]), axis=1)
+
+
+def density_grid(coords, bounds, bins=GRID_BINS, chunk_rows=CHUNK_ROWS):
+    # Point counts on a bins^d grid over bounds, accumulated chunk by chunk.
+    edges = [np.linspace(low, high if high > low else low + 1, bins + 1) for low, high in bounds]
+    counts = np.zeros([bins] * len(edges), dtype=np.int64)
+    for start, stop in iter_chunks(len(coords), chunk_rows):
+        chunk = coords[start:stop]
+        counts += np.histogramdd(chunk[_inside(chunk, bounds)], bins=edges)[0].astype(np.int64)
+    return counts, edges
+
+
+def _cells(points, bounds, bins):
+    scaled = (points - bounds[:, 0]) / np.where(bounds[:, 1] > bounds[:, 0], bounds[:, 1] - bounds[:, 0], 1)
+    index = np.clip((scaled * bins).astype(np.int64), 0, bins - 1)
+    return np.ravel_multi_index(index.T, [bins] * points.shape[1])
+
+
+def viewport_points(coords, bounds, budget=POINT_BUDGET, bins=GRID_BINS // 4, seed=0, chunk_rows=CHUNK_ROWS):
+    # Row numbers and coordinates of at most `budget` points inside bounds.
+    # When more points fall inside, each grid cell keeps a share of the budget
+    # proportional to its count (at least one), drawn by a seeded random
+    # priority, so sparse regions and outliers stay visible.
+    rng = np.random.default_rng(seed)
+    rows, cells, priorities = [], [], []
+    for start, stop in iter_chunks(len(coords), chunk_rows):
+        chunk = np.asarray(coords[start:stop])
+        inside = np.flatnonzero(_inside(chunk, bounds))
+        rows.append(inside + start)
+        cells.append(_cells(chunk[inside], bounds, bins))
+        priorities.append(rng.random(stop - start)[inside])
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    if len(rows) > budget:
+        cells, priorities = np.concatenate(cells), np.concatenate(priorities)
+        order = np.lexsort((priorities, cells))
+        cells, rows, priorities = cells[order], rows[order], priorities[order]
+        unique, starts, counts = np.unique(cells, return_index=True, return_counts=True)
+        quota = np.maximum(1, np.floor(counts * budget / len(rows))).astype(np.int64)
+        rank = np.arange(len(rows)) - np.repeat(starts, counts)
+        keep = rank < np.repeat(quota, counts)
+        rows, priorities = rows[keep], priorities[keep]
+        if len(rows) > budget:
+            rows = rows[np.argsort(priorities, kind="stable")[:budget]]
+        rows = np.sort(rows)
+    return rows, np.asarray(coords[rows]) if len(rows) else np.zeros((0, coords.shape[1]), dtype=np.float32)
@@ -0,0 +1,195 @@
+import os
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from projection import CACHE_DIR, iter_chunks
+
+BLOCK_ROWS = 65536
+DEFAULT_NPROBE = 8
+
+
+def _row_norms(vectors, block_rows=BLOCK_ROWS):
+    norms = np.empty(len(vectors), dtype=np.float32)
+    for start, stop in iter_chunks(len(vectors), block_rows):
+        norms[start:stop] = np.linalg.norm(vectors[start:stop], axis=1)
+    return np.where(norms > 0, norms, 1.0).astype(np.float32)
+
+
+def _merge_top_k(scores, rows, best_scores, best_rows, k):
+    scores = np.concatenate([best_scores, scores], axis=1)
+    rows = np.concatenate([best_rows, rows], axis=1)
+    if scores.shape[1] > k:
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, keep, axis=1)
+        rows = np.take_along_axis(rows, keep, axis=1)
+    return scores, rows
+
+
+def _sort_top_k(scores, rows):
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(rows, order, axis=1)
+
+
+def ivf_path(store, n_lists):
+    return os.path.join(CACHE_DIR, f"ivf_{store.name}_{store.version[:16]}_{n_lists}.npz")
+
+
+def default_n_lists(n_rows):
+    return int(np.clip(np.sqrt(n_rows), 1, 4096))
+
+
+class SimilarityIndex:
+    def __init__(self, store, block_rows=BLOCK_ROWS):
+        self.store = store
+        self.block_rows = block_rows
+        self.norms = _row_norms(store.vectors, block_rows)
+        self.centroids = None
+
+    def _normalize(self, queries):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        return queries / np.where(norms > 0, norms, 1.0)
+
+    def exact(self, queries, k=10, exclude_rows=None):
+        # Scores the queries against one block of rows at a time, keeping only
+        # a running top-k, so memory is O(len(queries) * block_rows).
+        queries = self._normalize(queries)
+        k = min(k, len(self.store))
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start, stop in iter_chunks(len(self.store), self.block_rows):
+            scores = queries @ self.store.vectors[start:stop].T / self.norms[start:stop]
+            if exclude_rows is not None:
+                hit = (exclude_rows >= start) & (exclude_rows < stop)
+                scores[np.flatnonzero(hit), exclude_rows[hit] - start] = -np.inf
+            rows = np.broadcast_to(np.arange(start, stop), scores.shape)
+            best_scores, best_rows = _merge_top_k(scores, rows, best_scores, best_rows, k)
+        return _sort_top_k(best_scores, best_rows)
+
+    def build_ivf(self, n_lists=None, sample_rows=200000, seed=0):
+        from sklearn.cluster import MiniBatchKMeans
+
+        n_rows = len(self.store)
+        n_lists = min(n_lists or default_n_lists(n_rows), n_rows)
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(n_rows, min(sample_rows, n_rows), replace=False))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, n_init=3, batch_size=4096)
+        kmeans.fit(self.store.vectors[sample] / self.norms[sample, None])
+        centroids = self._normalize(kmeans.cluster_centers_)
+
+        assignments = np.empty(n_rows, dtype=np.int32)
+        for start, stop in iter_chunks(n_rows, self.block_rows):
+            block = self.store.vectors[start:stop] / self.norms[start:stop, None]
+            assignments[start:stop] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assignments, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))])
+
+        path = ivf_path(self.store, n_lists)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        np.savez(path + ".tmp.npz", centroids=centroids, order=order, offsets=offsets)
+        os.replace(path + ".tmp.npz", path)
+        self._set_ivf(centroids, order, offsets)
+        return path
+
+    def load_ivf(self, n_lists=None):
+        n_lists = min(n_lists or default_n_lists(len(self.store)), len(self.store))
+        path = ivf_path(self.store, n_lists)
+        if not os.path.exists(path):
+            return self.build_ivf(n_lists)
+        with np.load(path) as ivf:
+            self._set_ivf(ivf["centroids"], ivf["order"], ivf["offsets"])
+        return path
+
+    def _set_ivf(self, centroids, order, offsets):
+        self.centroids, self.order, self.offsets = centroids, order, offsets
+
+    def approximate(self, queries, k=10, nprobe=DEFAULT_NPROBE, exclude_rows=None):
+        if self.centroids is None:
+            self.load_ivf()
+        queries = self._normalize(queries)
+        nprobe = min(nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, lists in enumerate(probes):
+            # Sorted candidates turn the memmap gather into a forward scan.
+            candidates = np.sort(np.concatenate([self.order[self.offsets[j]:self.offsets[j + 1]] for j in lists]))
+            if exclude_rows is not None:
+                candidates = candidates[candidates != exclude_rows[i]]
+            if not len(candidates):
+                continue
+            scores = self.store.vectors[candidates] @ queries[i] / self.norms[candidates]
+            top = min(k, len(candidates))
+            keep = np.argpartition(-scores, top - 1)[:top]
+            best_scores[i, :top] = scores[keep]
+            best_rows[i, :top] = candidates[keep]
+        return _sort_top_k(best_scores, best_rows)
+
+    def search(self, entity_ids, k=10, mode="exact", nprobe=DEFAULT_NPROBE):
+        rows = self.store.rows(entity_ids)
+        missing = [entity_id for entity_id, row in zip(entity_ids, rows) if row < 0]
+        if missing:
+            raise KeyError(", ".join(missing))
+        queries = self.store.vectors[rows]
+        if mode == "exact":
+            scores, neighbours = self.exact(queries, k, exclude_rows=rows)
+        else:
+            scores, neighbours = self.approximate(queries, k, nprobe, exclude_rows=rows)
+
+        # exact() caps k at the store size, and an excluded query row can
+        # come back with a -inf score when there are not enough candidates.
+        k = neighbours.shape[1]
+        found = (neighbours >= 0) & np.isfinite(scores)
+        query_ids = np.repeat(np.asarray(entity_ids), k).reshape(len(rows), k)
+        return pd.DataFrame({
+            "Query": query_ids[found],
+            "Rank": np.tile(np.arange(1, k + 1), (len(rows), 1))[found],
+            self.store.id_column: self.store.id_at(neighbours[found]),
+            "Cosine Similarity": scores[found],
+        })
+
+
+def build_entity_index():
+    from embedding_store import EmbeddingStore
+
+    index = SimilarityIndex(EmbeddingStore("entity_embedding"))
+    path = index.build_ivf()
+    print(f"entity similarity index built: {len(index.centroids)} lists")
+    return {"output": path, "lists": int(len(index.centroids))}
+
+
+def benchmark(index, n_queries=200, k=10, nprobe=DEFAULT_NPROBE, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(index.store), min(n_queries, len(index.store)), replace=False)
+    queries = index.store.vectors[rows]
+    index.load_ivf()
+
+    start = time.perf_counter()
+    _, exact_rows = index.exact(queries, k, exclude_rows=rows)
+    exact_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    _, approx_rows = index.approximate(queries, k, nprobe, exclude_rows=rows)
+    approx_ms = (time.perf_counter() - start) * 1000
+
+    hits = [len(np.intersect1d(a, e)) for a, e in zip(approx_rows, exact_rows)]
+    return {"queries": len(rows), "k": k, "nprobe": nprobe, "lists": len(index.centroids),
+            f"recall@{k}": float(np.mean(hits) / k),
+            "exact_ms_per_query": exact_ms / len(rows), "approx_ms_per_query": approx_ms / len(rows)}
+
+
+if __name__ == "__main__":
+    from embedding_store import EmbeddingStore
+
+    parser = argparse.ArgumentParser(description="Recall/latency of the IVF index against brute force.")
+    parser.add_argument("--name", default="entity_embedding")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, DEFAULT_NPROBE, 16])
+    args = parser.parse_args()
+
+    index = SimilarityIndex(EmbeddingStore(args.name))
+    for nprobe in args.nprobe:
+        print(benchmark(index, args.queries, args.k, nprobe))
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from collections import defaultdict
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGE_MODULES = ["overview", "behaviors_news", "entity_analysis", "relation_analysis", "user_profile"]
+# Modules the landing page must never import; they belong to individual pages.
+# Streamlit itself imports the plotly package root, so only plotly.express counts.
+HEAVY_MODULES = ["sklearn", "seaborn", "plotly.express", "wordcloud", "mpl_toolkits", "matplotlib", "scipy"]
+
+
+def parse_importtime(stderr):
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append({"name": name.strip(), "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                        "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    return modules
+
+
+def import_profile(module, top=15):
+    command = [sys.executable, "-X", "importtime", "-c", f"import {module}"]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=REPO_DIR, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+
+    modules = parse_importtime(result.stderr)
+    by_package = defaultdict(int)
+    for entry in modules:
+        by_package[entry["name"].split(".")[0]] += entry["self_us"]
+    target = next((m for m in modules if m["name"] == module and m["depth"] == 0), None)
+    packages = sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(target["cumulative_us"] / 1000, 1) if target else None,
+        "packages": [{"package": name, "self_ms": round(us / 1000, 1)} for name, us in packages],
+        "heavy": [heavy for heavy in HEAVY_MODULES
+                  if any(m["name"] == heavy or m["name"].startswith(heavy + ".") for m in modules)],
+    }
+
+
+def build_report(budget_ms):
+    landing = import_profile("main")
+    pages = [import_profile(module) for module in PAGE_MODULES]
+    failures = []
+    if landing["heavy"]:
+        failures.append(f"landing page imports heavy modules: {', '.join(landing['heavy'])}")
+    if budget_ms is not None and landing["import_ms"] is not None and landing["import_ms"] > budget_ms:
+        failures.append(f"landing page import took {landing['import_ms']} ms, budget is {budget_ms} ms")
+    return {"python": sys.version.split()[0], "budget_ms": budget_ms, "landing": landing,
+            "pages": pages, "failures": failures}
+
+
+def print_report(report):
+    for profile in [report["landing"]] + report["pages"]:
+        print(f"{profile['module']:<20} import {profile['import_ms']:>8} ms   wall {profile['wall_ms']:>8} ms")
+        for package in profile["packages"][:5]:
+            print(f"    {package['package']:<24} {package['self_ms']:>8} ms")
+    for failure in report["failures"]:
+        print(f"FAIL: {failure}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time breakdown for the dashboard cold start.")
+    parser.add_argument("--budget-ms", type=float, default=None, help="maximum import time for main.py")
+    parser.add_argument("--output", help="write the report as JSON to this path")
+    parser.add_argument("--check", action="store_true", help="exit non-zero when the budget is exceeded")
+    args = parser.parse_args()
+
+    report = build_report(args.budget_ms)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.check and report["failures"]:
+        sys.exit(1)
@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from preprocess import DATASETS, DIM_COLUMNS, TIME_FORMAT
+
+# Row counts per scale. "small" and "large" follow the MIND-small and
+# MIND-large training splits; "tiny" is for smoke runs.
+SCALES = {
+    "tiny": {"users": 1000, "news": 500, "behaviors": 2000, "entities": 400, "relations": 60},
+    "small": {"users": 50000, "news": 51282, "behaviors": 156965, "entities": 26904, "relations": 1091},
+    "large": {"users": 711222, "news": 101527, "behaviors": 2232748, "entities": 100000, "relations": 1500},
+    "large10": {"users": 7112220, "news": 1015270, "behaviors": 22327480, "entities": 1000000, "relations": 15000},
+}
+CATEGORIES = ["news", "sports", "finance", "foodanddrink", "lifestyle", "travel", "video", "weather", "health",
+              "autos", "tv", "music", "movies", "entertainment", "kids", "middleeast", "northamerica"]
+SUBCATEGORIES_PER_CATEGORY = 16
+VOCABULARY_SIZE = 5000
+START_TIME = pd.Timestamp("2019-11-09")
+SPAN_SECONDS = 6 * 24 * 3600
+HISTORY_MEAN = 32
+IMPRESSIONS_MEAN = 37
+CLICK_RATE = 0.04
+CHUNK_ROWS = 50000
+
+
+def zipf_sampler(n, exponent=1.1):
+    # Inverse-CDF sampler over ranks 0..n-1 with weights 1 / (rank + 1)^exponent.
+    cdf = np.cumsum(1.0 / np.arange(1, n + 1) ** exponent)
+    cdf /= cdf[-1]
+    return lambda rng, size: np.minimum(np.searchsorted(cdf, rng.random(size)), n - 1)
+
+
+def vocabulary(rng, size=VOCABULARY_SIZE):
+    syllables = np.array([c + v for c in "bcdfghklmnprstvz" for v in "aeiou"])
+    lengths = rng.integers(2, 4, size=size * 2)
+    words = pd.unique(np.array(["".join(rng.choice(syllables, n)) for n in lengths]))
+    return words[:size]
+
+
+def _entities_json(rng, sample_entity, count, text_length):
+    mentions = []
+    for entity in sample_entity(rng, count):
+        mentions.append({"Label": f"Entity {entity + 1}", "Type": str(rng.choice(list("PGOCUJEM"))),
+                         "WikidataId": f"Q{entity + 1}", "Confidence": round(float(rng.random()), 4),
+                         "OccurrenceOffsets": [int(rng.integers(0, max(text_length, 1)))],
+                         "SurfaceForms": [f"Entity {entity + 1}"]})
+    return json.dumps(mentions)
+
+
+def write_news(path, counts, rng):
+    words = vocabulary(rng)
+    sample_word = zipf_sampler(len(words))
+    sample_entity = zipf_sampler(counts["entities"])
+    n_news = counts["news"]
+    categories = rng.integers(0, len(CATEGORIES), n_news)
+    subcategories = np.minimum(rng.geometric(0.25, n_news) - 1, SUBCATEGORIES_PER_CATEGORY - 1)
+    title_lengths = rng.poisson(10, n_news) + 1
+    abstract_lengths = np.where(rng.random(n_news) < 0.05, 0, rng.poisson(35, n_news))
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        for row in range(n_news):
+            title = " ".join(words[sample_word(rng, title_lengths[row])])
+            abstract = " ".join(words[sample_word(rng, abstract_lengths[row])])
+            category = CATEGORIES[categories[row]]
+            f.write("\t".join([
+                f"N{row + 1}", category, f"{category}{subcategories[row]}", title.capitalize(), abstract,
+                f"https://assets.msn.com/labs/mind/N{row + 1}.html",
+                _entities_json(rng, sample_entity, rng.poisson(1.2), len(title)),
+                _entities_json(rng, sample_entity, rng.poisson(1.8), len(abstract)),
+            ]) + "\n")
+
+
+def write_behaviors(path, counts, seed):
+    n_news = counts["news"]
+    news_ids = np.array([f"N{i + 1}" for i in range(n_news)], dtype=object)
+    sample_news = zipf_sampler(n_news)
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        for chunk, start in enumerate(range(0, counts["behaviors"], CHUNK_ROWS)):
+            # One generator per chunk keeps the output independent of how much
+            # was written before, so a file can be regenerated piecewise.
+            rng = np.random.default_rng([seed, 1, chunk])
+            size = min(CHUNK_ROWS, counts["behaviors"] - start)
+            users = rng.integers(1, counts["users"] + 1, size)
+            times = START_TIME + pd.to_timedelta(np.sort(rng.integers(0, SPAN_SECONDS, size)), unit="s")
+            times = times.strftime(TIME_FORMAT)
+            history_lengths = np.where(rng.random(size) < 0.02, 0, rng.poisson(HISTORY_MEAN, size))
+            impression_lengths = rng.poisson(IMPRESSIONS_MEAN, size) + 1
+            history = news_ids[sample_news(rng, int(history_lengths.sum()))]
+            shown = news_ids[rng.integers(0, n_news, int(impression_lengths.sum()))]
+            labels = np.where(rng.random(len(shown)) < CLICK_RATE, "-1", "-0")
+            # Every impression list carries at least one click, as in MIND.
+            labels[np.cumsum(impression_lengths) - impression_lengths] = "-1"
+            shown = shown + labels
+            history_end, shown_end = np.cumsum(history_lengths), np.cumsum(impression_lengths)
+            lines = []
+            for row in range(size):
+                lines.append(f"{start + row + 1}\tU{users[row]}\t{times[row]}\t"
+                             f"{' '.join(history[history_end[row] - history_lengths[row]:history_end[row]])}\t"
+                             f"{' '.join(shown[shown_end[row] - impression_lengths[row]:shown_end[row]])}\n")
+            f.writelines(lines)
+
+
+def write_vectors(path, prefix, n_rows, seed, stream):
+    # Real .vec files end every line with a tab; the generator does the same.
+    fmt = prefix + "%d\t" + "\t".join(["%.6f"] * len(DIM_COLUMNS)) + "\t"
+    with open(path, "wb") as f:
+        for chunk, start in enumerate(range(0, n_rows, CHUNK_ROWS)):
+            rng = np.random.default_rng([seed, stream, chunk])
+            size = min(CHUNK_ROWS, n_rows - start)
+            vectors = rng.normal(0, 0.1, (size, len(DIM_COLUMNS)))
+            np.savetxt(f, np.column_stack([np.arange(start + 1, start + size + 1), vectors]), fmt=fmt)
+
+
+def generate(output_dir, scale="tiny", seed=0):
+    counts = SCALES[scale]
+    os.makedirs(output_dir, exist_ok=True)
+    sources = {name: os.path.join(output_dir, spec["source"]) for name, spec in DATASETS.items()}
+    write_news(sources["news"], counts, np.random.default_rng([seed, 0]))
+    write_behaviors(sources["behaviors"], counts, seed)
+    write_vectors(sources["entity_embedding"], "Q", counts["entities"], seed, 2)
+    write_vectors(sources["relation_embedding"], "P", counts["relations"], seed, 3)
+    with open(os.path.join(output_dir, "synthetic.json"), "w", encoding="utf-8") as f:
+        json.dump({"scale": scale, "seed": seed, **counts}, f, indent=2)
+    return sources
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic MIND files in the original TSV/.vec formats.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--scale", choices=list(SCALES), default="tiny")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    for path in generate(args.output_dir, args.scale, args.seed).values():
+        print(f"wrote {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import sqlite3
+import subprocess
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+import pytest
+from scipy import sparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Runs ingest.py with the hourly merge failing, i.e. an ingest that stops
+# after the dictionaries, history and CTR have taken the segment.
+INTERRUPTED = """
+import ingest
+
+def crash(*args):
+    raise RuntimeError("interrupted")
+
+ingest.update_hourly = crash
+ingest.ingest([{path!r}])
+"""
+
+
+def run(workspace, *args, check=True):
+    env = dict(os.environ, MIND_RAW_DIR=str(workspace / "raw"), MIND_DATA_DIR=str(workspace / "data"))
+    result = subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True)
+    if check:
+        assert result.returncode == 0, result.stderr
+    return result
+
+
+def workspace(root, name, raw, behaviors):
+    # A data directory preprocessed from the given behaviors lines.
+    path = root / name
+    (path / "raw").mkdir(parents=True)
+    for source in raw.iterdir():
+        if source.name != "behaviors.tsv":
+            (path / "raw" / source.name).symlink_to(source)
+    (path / "raw" / "behaviors.tsv").write_text("".join(behaviors), encoding="utf-8")
+    run(path, "preprocess.py")
+    return path
+
+
+@pytest.fixture(scope="module")
+def segments(tmp_path_factory):
+    root = tmp_path_factory.mktemp("mind")
+    subprocess.run([sys.executable, "synthetic_mind.py", str(root / "raw"), "--scale", "tiny"], cwd=ROOT, check=True,
+                   capture_output=True)
+    with open(root / "raw" / "behaviors.tsv", encoding="utf-8") as f:
+        lines = f.readlines()
+    parts = {"base": lines[:1000], "a": lines[1000:1500], "b": lines[1500:]}
+    for name in ["a", "b"]:
+        (root / f"{name}.tsv").write_text("".join(parts[name]), encoding="utf-8")
+    return root, parts
+
+
+def assert_same_state(data, expected):
+    for space in ["news", "user"]:
+        np.testing.assert_array_equal(np.load(data / "dictionaries" / f"{space}.npy"),
+                                      np.load(expected / "dictionaries" / f"{space}.npy"))
+    assert (sparse.load_npz(data / "user_history.npz") != sparse.load_npz(expected / "user_history.npz")).nnz == 0
+    with np.load(data / "ctr.npz") as ctr, np.load(expected / "ctr.npz") as full_ctr:
+        for key in full_ctr.files:
+            np.testing.assert_array_equal(ctr[key], full_ctr[key], err_msg=key)
+    pd.testing.assert_frame_equal(pd.read_parquet(data / "behaviors_hourly.parquet"),
+                                  pd.read_parquet(expected / "behaviors_hourly.parquet"))
+    counts = []
+    for path in [data, expected]:
+        connection = sqlite3.connect(path / "user_store.sqlite")
+        counts.append((ds.dataset(path / "behaviors", format="parquet", partitioning="hive").count_rows(),
+                       *connection.execute("SELECT (SELECT COUNT(*) FROM sessions), (SELECT COUNT(*) FROM users)")
+                       .fetchone()))
+        connection.close()
+    assert counts[0] == counts[1]
+
+
+def test_interrupted_ingest_refuses_other_segments(segments, tmp_path):
+    root, parts = segments
+    data = workspace(tmp_path, "incremental", root / "raw", parts["base"])
+    assert run(data, "-c", INTERRUPTED.format(path=str(root / "a.tsv")), check=False).returncode != 0
+
+    refused = run(data, "ingest.py", str(root / "b.tsv"), check=False)
+    assert refused.returncode != 0 and "interrupted" in refused.stderr
+    with open(data / "data" / "manifest.json", encoding="utf-8") as f:
+        assert json.load(f)["behaviors"]["pending"]["source"] == str(root / "a.tsv")
+
+    run(data, "ingest.py", str(root / "a.tsv"), str(root / "b.tsv"))
+    full = workspace(tmp_path, "full", root / "raw", parts["base"] + parts["a"] + parts["b"])
+    assert_same_state(data / "data", full / "data")
+
+
+def test_rolled_back_ingest_leaves_no_trace(segments, tmp_path):
+    root, parts = segments
+    data = workspace(tmp_path, "incremental", root / "raw", parts["base"])
+    assert run(data, "-c", INTERRUPTED.format(path=str(root / "a.tsv")), check=False).returncode != 0
+
+    run(data, "ingest.py", "--rollback", str(root / "b.tsv"))
+    full = workspace(tmp_path, "full", root / "raw", parts["base"] + parts["b"])
+    assert_same_state(data / "data", full / "data")
@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from preprocess import iter_table_batches, table_dataset, table_path
+from impressions import parse_impressions
+
+HOUR = 3600
+HOURLY_COLUMNS = ["Hour", "Sessions", "Users", "Impressions", "Clicks"]
+NO_NEWS = pd.Index([], dtype=object)
+
+
+def to_epoch(timestamp):
+    return int((pd.Timestamp(timestamp) - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1))
+
+
+def from_epoch(seconds):
+    return pd.to_datetime(seconds, unit="s")
+
+
+def hourly_partial(frame):
+    # Additive per-hour counts of one batch of behaviors, plus its distinct
+    # (hour, user) pairs, since user counts do not add across batches.
+    rows, _, labels, _ = parse_impressions(frame["Impressions"], NO_NEWS)
+    hours = frame["Time"].to_numpy() // HOUR * HOUR
+    counts = pd.DataFrame({
+        "Hour": hours,
+        "Sessions": 1,
+        "Impressions": np.bincount(rows, minlength=len(frame)),
+        "Clicks": np.bincount(rows, weights=labels == 1, minlength=len(frame)).astype(np.int64),
+    }).groupby("Hour").sum()
+    return counts, pd.DataFrame({"Hour": hours, "User ID": frame["User ID"]}).drop_duplicates()
+
+
+def save_hourly(hourly, **metadata):
+    table = pa.Table.from_pandas(hourly[HOURLY_COLUMNS], preserve_index=False)
+    table = table.replace_schema_metadata({**table.schema.metadata,
+                                           **{key.encode(): str(value).encode() for key, value in metadata.items()}})
+    output_file = table_path("behaviors_hourly")
+    pq.write_table(table, output_file + ".tmp")
+    os.replace(output_file + ".tmp", output_file)
+
+
+def build_hourly_activity(batch_rows=65536):
+    partials, user_hours = [], []
+    for batch in iter_table_batches("behaviors", ["Time", "User ID", "Impressions"], batch_rows):
+        counts, users = hourly_partial(batch.to_pandas())
+        partials.append(counts)
+        user_hours.append(users)
+
+    if partials:
+        hourly = pd.concat(partials).groupby("Hour").sum()
+        users = pd.concat(user_hours).drop_duplicates().groupby("Hour").size()
+        hourly = hourly.assign(Users=users).reset_index()
+    else:
+        hourly = pd.DataFrame({column: pd.Series(dtype="int64") for column in HOURLY_COLUMNS})
+
+    save_hourly(hourly)
+    print(f"hourly activity built: {len(hourly)} hours")
+    return {"rows": int(len(hourly))}
+
+
+def merge_hourly(hourly, counts, user_hours):
+    # Adds a partial from hourly_partial to the stored table. Users of hours
+    # the table already has are recounted from the stored partitions of just
+    # those hours together with the new pairs.
+    stored = hourly.set_index("Hour")
+    merged = pd.concat([stored[["Sessions", "Impressions", "Clicks"]], counts]).groupby("Hour").sum()
+    users = stored["Users"].reindex(merged.index).fillna(user_hours.groupby("Hour").size())
+    overlap = np.intersect1d(stored.index, counts.index)
+    if len(overlap):
+        old = read_time_range(int(overlap.min()), int(overlap.max()) + HOUR, ["Time", "User ID"])
+        pairs = pd.concat([pd.DataFrame({"Hour": old["Time"].to_numpy() // HOUR * HOUR, "User ID": old["User ID"]}),
+                           user_hours]).drop_duplicates()
+        users.loc[overlap] = pairs[pairs["Hour"].isin(overlap)].groupby("Hour").size().reindex(overlap)
+    return merged.assign(Users=users.astype(np.int64)).reset_index()[HOURLY_COLUMNS]
+
+
+def time_range_filter(start, end):
+    # The Day bounds prune whole partitions; the Time bounds then skip row
+    # groups inside the matching days via Parquet min/max statistics.
+    first_day = from_epoch(start).strftime("%Y-%m-%d")
+    last_day = from_epoch(max(end - 1, start)).strftime("%Y-%m-%d")
+    return ((ds.field("Day") >= first_day) & (ds.field("Day") <= last_day)
+            & (ds.field("Time") >= start) & (ds.field("Time") < end))
+
+
+def read_time_range(start, end, columns=None):
+    return table_dataset("behaviors").to_table(columns=columns, filter=time_range_filter(start, end)).to_pandas()
+
+
+def range_summary(start, end, top=20):
+    sessions = read_time_range(start, end, ["User ID", "Impressions"])
+    tokens = sessions["Impressions"].fillna("").str.split().explode().dropna()
+    clicked = tokens[tokens.str.endswith("-1")].str[:-2]
+    summary = {"Sessions": len(sessions), "Users": sessions["User ID"].nunique(),
+               "Impressions": len(tokens), "Clicks": len(clicked)}
+    return summary, clicked.value_counts().head(top)
@@ -0,0 +1,124 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from wordcloud import STOPWORDS
+
+from preprocess import table_path
+
+TOKEN_PATTERN = r"\w[\w']*"
+TEXT_FIELDS = ["Title", "Abstract"]
+CHUNK_ROWS = 20000
+STOPWORD_SET = frozenset(word.lower() for word in STOPWORDS)
+# WordCloud's default score above which a word pair is drawn as one token.
+COLLOCATION_THRESHOLD = 30
+
+
+def _words(texts):
+    # The tokens WordCloud.process_text keeps before stopwords: word regex,
+    # trailing possessive removed, no bare numbers; case is kept.
+    words = texts.fillna("").str.findall(TOKEN_PATTERN).explode().dropna()
+    words = words.where(~words.str.lower().str.endswith("'s"), words.str[:-2])
+    return words[~words.str.isdigit()]
+
+
+def count_tokens(news):
+    # Counts of non-stopword words and of adjacent pairs of them within one
+    # text ("word1 word2"), so token_frequencies can find collocations for
+    # any selection of categories.
+    frames = []
+    for field in TEXT_FIELDS:
+        words = _words(news[field])
+        rows = words.index.to_numpy()
+        stop = words.str.lower().isin(STOPWORD_SET).to_numpy()
+        pair = np.zeros(len(words), dtype=bool)
+        pair[:-1] = (rows[1:] == rows[:-1]) & ~stop[:-1] & ~stop[1:]
+        following = words.shift(-1)
+        tokens = pd.concat([words[~stop], words[pair] + " " + following[pair]])
+        pairs = news.loc[tokens.index, ["Category", "SubCategory"]].assign(Token=tokens.to_numpy())
+        counts = pairs.groupby(["Category", "SubCategory", "Token"], observed=True).size()
+        frames.append(counts.rename("Count").reset_index().assign(Field=field))
+    return pd.concat(frames, ignore_index=True)
+
+
+def build_token_index(chunk_rows=CHUNK_ROWS, workers=None):
+    news = pd.read_parquet(table_path("news"), columns=["Category", "SubCategory"] + TEXT_FIELDS)
+    chunks = [news.iloc[start:start + chunk_rows] for start in range(0, len(news), chunk_rows)]
+    workers = workers or max(1, min(len(chunks), os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        partials = list(pool.map(count_tokens, chunks))
+
+    counts = pd.concat(partials, ignore_index=True) if partials else count_tokens(news)
+    counts = (counts.groupby(["Field", "Category", "SubCategory", "Token"], observed=True)["Count"]
+              .sum().reset_index().sort_values(["Field", "Count"], ascending=[True, False]))
+    counts["Count"] = counts["Count"].astype("int32")
+    for column in ["Field", "Category", "SubCategory"]:
+        counts[column] = counts[column].astype("category")
+
+    output_file = table_path("token_counts")
+    pq.write_table(pa.Table.from_pandas(counts, preserve_index=False), output_file + ".tmp", compression="zstd")
+    os.replace(output_file + ".tmp", output_file)
+    print(f"token index built: {counts['Token'].nunique()} distinct tokens")
+    return {"rows": int(len(counts))}
+
+
+def _fuse(counts):
+    # WordCloud's process_tokens on summed counts: plurals ending in a single
+    # "s" merge into their singular when it occurs, and each word takes its
+    # most common case. Returns the fused counts and the standard form of
+    # every lower-case token.
+    tokens = counts.index.to_series()
+    lower = tokens.str.lower()
+    plural = lower.str.endswith("s") & ~lower.str.endswith("ss") & lower.str[:-1].isin(pd.Index(lower.unique()))
+    frame = pd.DataFrame({"Key": lower.where(~plural, lower.str[:-1]),
+                          "Variant": tokens.where(~plural, tokens.str[:-1]), "Count": counts.to_numpy()})
+    variants = frame.groupby(["Key", "Variant"])["Count"].sum().sort_values(ascending=False, kind="stable")
+    best = variants.groupby(level="Key").head(1).index
+    standard = pd.Series(best.get_level_values("Variant"), index=best.get_level_values("Key"))
+    fused = variants.groupby(level="Key").sum()
+    fused.index = standard[fused.index].to_numpy()
+    forms = pd.Series(standard[frame["Key"]].to_numpy(), index=lower.to_numpy())
+    return fused, forms[~forms.index.duplicated()]
+
+
+def _likelihood(k, n, x):
+    return np.log(np.maximum(x, 1e-10)) * k + np.log(np.maximum(1 - x, 1e-10)) * (n - k)
+
+
+def collocation_counts(totals, threshold=COLLOCATION_THRESHOLD):
+    # WordCloud.process_text with its default collocations: word pairs whose
+    # Dunning likelihood ratio exceeds the threshold are counted as one
+    # token and their count is taken off both words.
+    bigram = totals.index.str.contains(" ")
+    unigrams, forms = _fuse(totals[~bigram])
+    if not bigram.any():
+        return unigrams
+    bigrams, _ = _fuse(totals[bigram])
+    n_words = totals[~bigram].sum()
+    parts = bigrams.index.str.split(" ", n=1)
+    word1 = forms[parts.str[0].str.lower()].to_numpy()
+    word2 = forms[parts.str[1].str.lower()].to_numpy()
+    c12, c1, c2 = bigrams.to_numpy(), unigrams[word1].to_numpy(), unigrams[word2].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p, p1, p2 = c2 / n_words, c12 / c1, (c2 - c12) / (n_words - c1)
+        score = -2 * (_likelihood(c12, c1, p) + _likelihood(c2 - c12, n_words - c1, p)
+                      - _likelihood(c12, c1, p1) - _likelihood(c2 - c12, n_words - c1, p2))
+    score[(n_words <= c1) | (n_words <= c2)] = 0
+    found = score > threshold
+    taken = pd.concat([pd.Series(c12[found], index=word1[found]), pd.Series(c12[found], index=word2[found])])
+    merged = unigrams.sub(taken.groupby(level=0).sum(), fill_value=0)
+    merged = pd.concat([merged, bigrams[found]])
+    return merged[merged > 0].astype(np.int64)
+
+
+def token_frequencies(counts, field, categories=None, subcategories=None, max_words=200):
+    selected = counts[counts["Field"] == field]
+    if categories:
+        selected = selected[selected["Category"].isin(categories)]
+    if subcategories:
+        selected = selected[selected["SubCategory"].isin(subcategories)]
+    totals = selected.groupby("Token", observed=True)["Count"].sum()
+    return collocation_counts(totals).nlargest(max_words).to_dict()
@@ -0,0 +1,147 @@
+import os
+import time
+import weakref
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from projection import iter_chunks
+from similarity import BLOCK_ROWS, _merge_top_k, _sort_top_k
+
+
+def _squared_norms(vectors, block_rows=BLOCK_ROWS):
+    norms = np.empty(len(vectors), dtype=np.float32)
+    for start, stop in iter_chunks(len(vectors), block_rows):
+        block = np.asarray(vectors[start:stop], dtype=np.float32)
+        norms[start:stop] = np.einsum("ij,ij->i", block, block)
+    return norms
+
+
+def _split(n_rows, parts):
+    bounds = np.linspace(0, n_rows, parts + 1).astype(np.int64)
+    return [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+class TripleScorer:
+    # TransE plausibility of (head, relation, tail) triples: the L2 distance
+    # ||h + r - t||, smaller is more plausible. One scorer is safe to share
+    # between threads; its worker pool is created once and reused by every
+    # query, and matrix products release the GIL while the workers run.
+    def __init__(self, entities, relations, block_rows=BLOCK_ROWS, workers=None):
+        if entities.dims != relations.dims:
+            raise ValueError(f"entity and relation vectors differ in size: {entities.dims} != {relations.dims}")
+        self.entities = entities
+        self.relations = relations
+        self.block_rows = block_rows
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.entity_norms = _squared_norms(entities.vectors, block_rows)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="triples")
+        # Shuts the workers down when the scorer is dropped, e.g. when a cache
+        # replaces it after the stores are rebuilt.
+        self._close = weakref.finalize(self, self._pool.shutdown, wait=False)
+
+    def _rows(self, store, ids):
+        rows = store.rows(ids)
+        missing = [value for value, row in zip(ids, rows) if row < 0]
+        if missing:
+            raise KeyError(", ".join(missing))
+        return rows
+
+    def queries(self, head_ids, relation_ids):
+        heads = self._rows(self.entities, head_ids)
+        relations = self._rows(self.relations, relation_ids)
+        return heads, np.asarray(self.entities.vectors[heads] + self.relations.vectors[relations], dtype=np.float32)
+
+    def score(self, head_ids, relation_ids, tail_ids):
+        heads, queries = self.queries(head_ids, relation_ids)
+        tails = self.entities.vectors[self._rows(self.entities, tail_ids)]
+        return np.linalg.norm(queries - tails, axis=1)
+
+    def _top_k_range(self, queries, query_norms, k, start, stop, exclude_rows):
+        # ||q - t||^2 = ||q||^2 - 2 q.t + ||t||^2, one block of tails at a time;
+        # the running top-k keeps the negated distances.
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for block_start, block_stop in iter_chunks(stop - start, self.block_rows):
+            block_start, block_stop = block_start + start, block_stop + start
+            block = self.entities.vectors[block_start:block_stop]
+            scores = 2 * (queries @ block.T) - query_norms[:, None] - self.entity_norms[block_start:block_stop]
+            if exclude_rows is not None:
+                hit = (exclude_rows >= block_start) & (exclude_rows < block_stop)
+                scores[np.flatnonzero(hit), exclude_rows[hit] - block_start] = -np.inf
+            rows = np.broadcast_to(np.arange(block_start, block_stop), scores.shape)
+            best_scores, best_rows = _merge_top_k(scores, rows, best_scores, best_rows, k)
+        return best_scores, best_rows
+
+    def top_tails(self, queries, k=10, exclude_rows=None):
+        # Each worker scans its own contiguous slice of the entity matrix, so
+        # memory is O(len(queries) * block_rows) per worker.
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+        k = min(k, len(self.entities))
+        ranges = _split(len(self.entities), self.workers)
+        parts = self._pool.map(lambda bounds: self._top_k_range(queries, query_norms, k, *bounds, exclude_rows), ranges)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for scores, rows in parts:
+            best_scores, best_rows = _merge_top_k(scores, rows, best_scores, best_rows, k)
+        scores, rows = _sort_top_k(best_scores, best_rows)
+        return np.sqrt(np.maximum(-scores, 0)), rows
+
+    def predict_tails(self, head_ids, relation_ids, k=10, exclude_head=True):
+        heads, queries = self.queries(head_ids, relation_ids)
+        distances, rows = self.top_tails(queries, k, exclude_rows=heads if exclude_head else None)
+        found = np.isfinite(distances)
+        k = rows.shape[1]
+        return pd.DataFrame({
+            "Head": np.repeat(np.asarray(head_ids), k).reshape(len(heads), k)[found],
+            "Relation": np.repeat(np.asarray(relation_ids), k).reshape(len(heads), k)[found],
+            "Rank": np.tile(np.arange(1, k + 1), (len(heads), 1))[found],
+            "Tail": self.entities.id_at(rows[found]),
+            "Distance": distances[found],
+        })
+
+    def close(self):
+        self._close()
+
+
+def benchmark(scorer, n_queries=200, batch_sizes=(1, 32), k=10, seed=0):
+    # Latency of top-k tail prediction for random (head, relation) pairs,
+    # issued one batch at a time.
+    rng = np.random.default_rng(seed)
+    heads = rng.integers(0, len(scorer.entities), n_queries)
+    relations = rng.integers(0, len(scorer.relations), n_queries)
+    queries = np.asarray(scorer.entities.vectors[heads] + scorer.relations.vectors[relations], dtype=np.float32)
+    results = []
+    for batch_size in batch_sizes:
+        latencies = []
+        for start, stop in iter_chunks(n_queries, batch_size):
+            began = time.perf_counter()
+            scorer.top_tails(queries[start:stop], k, exclude_rows=heads[start:stop])
+            latencies.append((time.perf_counter() - began) * 1000)
+        latencies = np.asarray(latencies)
+        results.append({"entities": len(scorer.entities), "workers": scorer.workers, "batch": batch_size, "k": k,
+                        "batches": len(latencies), "p50_ms": float(np.percentile(latencies, 50)),
+                        "p95_ms": float(np.percentile(latencies, 95)),
+                        "ms_per_query": float(latencies.sum() / n_queries)})
+    return results
+
+
+if __name__ == "__main__":
+    from embedding_store import EmbeddingStore
+
+    parser = argparse.ArgumentParser(description="Latency of blocked TransE tail prediction.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 32])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, min(8, os.cpu_count() or 1)])
+    args = parser.parse_args()
+
+    entities, relations = EmbeddingStore("entity_embedding"), EmbeddingStore("relation_embedding")
+    for workers in args.workers:
+        scorer = TripleScorer(entities, relations, workers=workers)
+        for result in benchmark(scorer, args.queries, args.batch, args.k):
+            print(result)
+        scorer.close()
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from preprocess import DATA_DIR, iter_table_batches
+from dictionary import Dictionary, dictionary_path
+
+
+def index_paths():
+    return {"matrix": os.path.join(DATA_DIR, "user_history.npz"),
+            "users": dictionary_path("user"), "news": dictionary_path("news")}
+
+
+def history_matrix(frame, news_dictionary, user_dictionary):
+    # Clicks in one batch of behaviors, as a user x news matrix of the shared
+    # dictionary codes; duplicates are left for merge_histories to collapse.
+    frame = frame[["User ID", "History"]].dropna(subset=["User ID"]).drop_duplicates()
+    pairs = frame.assign(History=frame["History"].str.split()).explode("History").dropna()
+    users, news = user_dictionary.encode(pairs["User ID"]), news_dictionary.encode(pairs["History"])
+    return sparse.coo_matrix((np.ones(len(pairs), dtype=np.int8), (users, news)),
+                             shape=(len(user_dictionary), len(news_dictionary)))
+
+
+def merge_histories(*matrices):
+    # Histories are sets of clicks, so merging is a union: users appear once
+    # per impression and repeated pairs collapse to a single click. Earlier
+    # matrices may predate dictionary growth and are padded to the largest shape.
+    shape = tuple(max(matrix.shape[axis] for matrix in matrices) for axis in range(2))
+    parts = [matrix.tocoo() for matrix in matrices]
+    rows = np.concatenate([part.row for part in parts])
+    cols = np.concatenate([part.col for part in parts])
+    merged = sparse.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=shape)
+    merged.sum_duplicates()
+    merged.data[:] = 1
+    return merged
+
+
+def save_history_index(matrix):
+    path = index_paths()["matrix"]
+    sparse.save_npz(path + ".tmp.npz", matrix)
+    os.replace(path + ".tmp.npz", path)
+
+
+def build_history_index(batch_rows=65536):
+    news_dictionary, user_dictionary = Dictionary("news"), Dictionary("user")
+    parts = [history_matrix(batch.to_pandas(), news_dictionary, user_dictionary)
+             for batch in iter_table_batches("behaviors", ["User ID", "History"], batch_rows)]
+    matrix = merge_histories(sparse.csr_matrix((len(user_dictionary), len(news_dictionary)), dtype=np.int8), *parts)
+    save_history_index(matrix)
+    print(f"user history index built: {matrix.shape[0]} users x {matrix.shape[1]} news, {matrix.nnz} clicks")
+    return {"users": int(matrix.shape[0]), "news": int(matrix.shape[1]), "clicks": int(matrix.nnz)}
+
+
+class HistoryIndex:
+    def __init__(self):
+        self.matrix = sparse.load_npz(index_paths()["matrix"]).tocsr()
+        self.user_ids = Dictionary("user").values
+        self.news_ids = Dictionary("news").values
+
+    def popularity(self):
+        counts = np.asarray(self.matrix.sum(axis=0, dtype=np.int64)).ravel()
+        return pd.Series(counts, index=self.news_ids, name="Users").sort_values(ascending=False, kind="stable")
+
+    def history(self, user_id):
+        row = self.user_ids.get_indexer([user_id])[0]
+        if row < 0:
+            raise KeyError(user_id)
+        start, stop = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        return self.news_ids[self.matrix.indices[start:stop]]
+
+    def history_lengths(self):
+        return pd.Series(np.diff(self.matrix.indptr), index=self.user_ids, name="History Length")
+
+
+def index_exists():
+    return all(os.path.exists(path) for path in index_paths().values())
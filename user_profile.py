@@ -0,0 +1,111 @@
+import time
+
+import streamlit as st
+import numpy as np
+import pandas as pd
+
+import data_loader
+import figures
+import profiling
+
+
+def _articles(codes, news):
+    # News dictionary codes below len(news) are news.parquet rows; the rest
+    # are articles that only occur in behaviors and have no metadata.
+    codes = np.asarray(codes)
+    known = codes[codes < len(news)]
+    return news.iloc[known].reset_index(drop=True)
+
+
+def render():
+
+    st.title("👤 User Profile")
+    st.markdown("Look up a single user's reading history, impressions, favourite categories and entity mix.")
+
+    from user_store import store_exists
+
+    if not store_exists():
+        st.error("❌ The user store has not been built yet. Run `python preprocess.py` and reload the page.")
+        return
+
+    try:
+        _profile(data_loader.user_store())
+    except TimeoutError as e:
+        st.error(f"❌ {e}")
+
+
+def _profile(store):
+    user_id = st.text_input("User ID:", value=store.sample_user() or "").strip()
+    if not user_id:
+        return
+
+    profiling.section("Lookup")
+    start = time.perf_counter()
+    try:
+        sessions = store.sessions(user_id)
+    except KeyError:
+        st.warning(f"No user with ID {user_id}.")
+        return
+    lookup_ms = (time.perf_counter() - start) * 1000
+    news = data_loader.load_table("news", ["News ID", "Category", "SubCategory", "Title"])
+
+    shown = np.concatenate(sessions["Shown"].tolist())
+    labels = np.concatenate(sessions["Labels"].tolist())
+    clicked = shown[labels == 1]
+    history = sessions["History"].iloc[-1]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Sessions", len(sessions))
+    col2.metric("History Length", len(history))
+    col3.metric("Impressions", len(shown))
+    col4.metric("Clicks", len(clicked))
+    st.caption(f"Looked up in {lookup_ms:.1f} ms · active {sessions['Time'].min()} – {sessions['Time'].max()}")
+
+    profiling.section("Click History")
+    st.header("🕵️ Click History")
+    st.dataframe(_articles(history, news), hide_index=True)
+
+    profiling.section("Impressions")
+    st.header("📑 Impressions")
+    st.dataframe(pd.DataFrame({
+        "Impression ID": sessions["Impression ID"],
+        "Time": sessions["Time"],
+        "Shown": sessions["Shown"].map(len),
+        "Clicks": [int((session_labels == 1).sum()) for session_labels in sessions["Labels"]],
+    }), hide_index=True)
+    impression_id = st.selectbox("Impression to inspect:", sessions["Impression ID"].tolist())
+    session = store.session(impression_id)
+    articles = _articles(session["Shown"], news)
+    articles.insert(0, "Clicked", session["Labels"][session["Shown"] < len(news)] == 1)
+    st.dataframe(articles, hide_index=True)
+
+    profiling.section("Clicked Categories")
+    st.header("📂 Clicked Categories")
+    # History clicks and clicks recorded in this user's impressions together.
+    clicked_articles = _articles(np.concatenate([history, clicked]), news)
+    category_counts = clicked_articles["Category"].value_counts()
+    category_counts = category_counts[category_counts > 0]
+    if category_counts.empty:
+        st.write("This user has no clicks on articles with metadata.")
+    else:
+        def draw_categories(fig):
+            ax = fig.subplots()
+            ax.bar(category_counts.index.astype(str), category_counts.to_numpy(), color="coral")
+            ax.set_xticks(range(len(category_counts)), category_counts.index.astype(str), rotation=45, ha="right")
+            ax.set_ylabel("Clicks")
+            ax.set_title(f"Categories Clicked by {user_id}")
+
+        figures.show(("user_categories", user_id, figures.data_version(category_counts)), draw_categories, figsize=(8, 4))
+
+    profiling.section("Entity Mix")
+    st.header("🌐 Entity Mix")
+    index = data_loader.entity_index()
+    rows = np.concatenate([history, clicked])
+    rows = rows[rows < index.news_entities.shape[0]]
+    mentions = np.asarray(index.news_entities[rows].sum(axis=0)).ravel()
+    top = np.argsort(mentions, kind="stable")[::-1][:15]
+    top = top[mentions[top] > 0]
+    if len(top):
+        st.dataframe(pd.DataFrame({"Entity ID": index.entity_ids[top], "Mentions": mentions[top].astype(int)}),
+                     hide_index=True)
+    else:
+        st.write("None of this user's clicked articles mention a known entity.")
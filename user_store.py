@@ -0,0 +1,227 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from preprocess import DATA_DIR, iter_table_batches
+from dictionary import Dictionary
+from impressions import parse_impressions
+
+BATCH_ROWS = 65536
+POOL_SIZE = 4
+# Per-connection page cache and memory map; with POOL_SIZE connections this
+# bounds what the store can hold in memory across all sessions.
+CACHE_KIB = 8 * 1024
+MMAP_BYTES = 64 * 1024 * 1024
+ACQUIRE_TIMEOUT = 10
+
+SCHEMA = """
+CREATE TABLE users (user_code INTEGER PRIMARY KEY, user_id TEXT NOT NULL);
+CREATE TABLE sessions (
+    impression_id INTEGER PRIMARY KEY,
+    user_code INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    history BLOB NOT NULL,
+    shown BLOB NOT NULL,
+    labels BLOB NOT NULL
+);
+"""
+INDEXES = """
+CREATE UNIQUE INDEX users_by_id ON users (user_id);
+CREATE INDEX sessions_by_user ON sessions (user_code, time);
+"""
+
+
+def store_path():
+    return os.path.join(DATA_DIR, "user_store.sqlite")
+
+
+def _row_slices(lengths):
+    ends = np.cumsum(lengths)
+    return zip((ends - lengths).tolist(), ends.tolist())
+
+
+def session_rows(frame, news_dictionary, user_dictionary):
+    # (impression_id, user_code, time, history, shown, labels) per row of a
+    # behaviors batch. History and impression lists are stored as int32 news
+    # dictionary codes, which are also news.parquet rows for every article
+    # in the news table.
+    history = frame["History"].fillna("").str.split()
+    history_codes = news_dictionary.encode(history.explode().dropna())
+    rows, shown_codes, labels, _ = parse_impressions(frame["Impressions"], news_dictionary.values)
+    shown_codes = shown_codes.astype(np.int32)
+    shown_lengths = np.bincount(rows, minlength=len(frame))
+    return zip(
+        frame["Impression ID"].tolist(),
+        user_dictionary.encode(frame["User ID"].astype(str)).tolist(),
+        frame["Time"].tolist(),
+        (history_codes[start:stop].tobytes() for start, stop in _row_slices(history.str.len().to_numpy())),
+        (shown_codes[start:stop].tobytes() for start, stop in _row_slices(shown_lengths)),
+        (labels[start:stop].tobytes() for start, stop in _row_slices(shown_lengths)),
+    )
+
+
+def build_user_store(batch_rows=BATCH_ROWS):
+    news_dictionary, user_dictionary = Dictionary("news"), Dictionary("user")
+    path = store_path()
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+    connection.executescript(SCHEMA)
+    connection.executemany("INSERT INTO users VALUES (?, ?)",
+                           zip(range(len(user_dictionary)), user_dictionary.values.tolist()))
+    sessions = 0
+    columns = ["Impression ID", "User ID", "Time", "History", "Impressions"]
+    for batch in iter_table_batches("behaviors", columns, batch_rows):
+        frame = batch.to_pandas()
+        connection.executemany("INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?)",
+                               session_rows(frame, news_dictionary, user_dictionary))
+        sessions += len(frame)
+    connection.executescript(INDEXES)
+    connection.execute("ANALYZE")
+    connection.commit()
+    connection.close()
+    os.replace(tmp_path, path)
+    print(f"user store built: {sessions} sessions of {len(user_dictionary)} users")
+    return {"sessions": sessions, "users": len(user_dictionary)}
+
+
+def append_sessions(frame, checksum):
+    # Adds one ingested behaviors segment in a single transaction; the
+    # segment's checksum is recorded with it, so a rerun after a crash either
+    # finds it complete or adds it from scratch.
+    news_dictionary, user_dictionary = Dictionary("news"), Dictionary("user")
+    connection = sqlite3.connect(store_path())
+    try:
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS ingested (checksum TEXT PRIMARY KEY)")
+            if connection.execute("SELECT 1 FROM ingested WHERE checksum = ?", (checksum,)).fetchone():
+                return 0
+            known = connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            connection.executemany("INSERT INTO users VALUES (?, ?)", zip(
+                range(known, len(user_dictionary)), user_dictionary.values[known:].tolist()))
+            connection.executemany("INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?)",
+                                   session_rows(frame, news_dictionary, user_dictionary))
+            connection.execute("INSERT INTO ingested VALUES (?)", (checksum,))
+    finally:
+        connection.close()
+    return len(frame)
+
+
+def remove_sessions(checksum, impression_offset, users):
+    # Undoes append_sessions for the latest segment: its impression IDs are
+    # the ones past the offset and its new users the codes from `users` on.
+    connection = sqlite3.connect(store_path())
+    try:
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS ingested (checksum TEXT PRIMARY KEY)")
+            connection.execute("DELETE FROM sessions WHERE impression_id > ?", (impression_offset,))
+            connection.execute("DELETE FROM users WHERE user_code >= ?", (users,))
+            connection.execute("DELETE FROM ingested WHERE checksum = ?", (checksum,))
+    finally:
+        connection.close()
+
+
+class ConnectionPool:
+    # Read-only connections shared by all sessions; at most `size` exist and
+    # callers wait for a free one instead of opening more.
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        connection.execute(f"PRAGMA cache_size = -{CACHE_KIB}")
+        connection.execute(f"PRAGMA mmap_size = {MMAP_BYTES}")
+        return connection
+
+    def _create(self):
+        # A failed connect gives its slot back.
+        try:
+            return self._connect()
+        except Exception:
+            with self.lock:
+                self.created -= 1
+            raise
+
+    def _wait(self):
+        try:
+            return self.idle.get(timeout=ACQUIRE_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError(f"all {self.size} user store connections stayed busy for {ACQUIRE_TIMEOUT} s; "
+                               "try again shortly") from None
+
+    @contextmanager
+    def connection(self):
+        try:
+            connection = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                create = self.created < self.size
+                self.created += create
+            connection = self._create() if create else self._wait()
+        try:
+            yield connection
+        finally:
+            self.idle.put(connection)
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class UserStore:
+    def __init__(self, pool=None):
+        self.pool = pool or ConnectionPool(store_path())
+
+    def sample_user(self):
+        with self.pool.connection() as connection:
+            row = connection.execute("SELECT user_id FROM users ORDER BY user_code LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def sessions(self, user_id):
+        # One row per impression log entry of the user, oldest first, with the
+        # code arrays decoded; raises KeyError for unknown users.
+        with self.pool.connection() as connection:
+            user = connection.execute("SELECT user_code FROM users WHERE user_id = ?", (user_id,)).fetchone()
+            if user is None:
+                raise KeyError(user_id)
+            rows = connection.execute(
+                "SELECT impression_id, time, history, shown, labels FROM sessions WHERE user_code = ? ORDER BY time",
+                user,
+            ).fetchall()
+        return pd.DataFrame({
+            "Impression ID": [row[0] for row in rows],
+            "Time": pd.to_datetime([row[1] for row in rows], unit="s"),
+            "History": [np.frombuffer(row[2], dtype=np.int32) for row in rows],
+            "Shown": [np.frombuffer(row[3], dtype=np.int32) for row in rows],
+            "Labels": [np.frombuffer(row[4], dtype=np.int8) for row in rows],
+        })
+
+    def session(self, impression_id):
+        with self.pool.connection() as connection:
+            row = connection.execute(
+                "SELECT users.user_id, time, shown, labels FROM sessions JOIN users USING (user_code) "
+                "WHERE impression_id = ?", (int(impression_id),),
+            ).fetchone()
+        if row is None:
+            raise KeyError(impression_id)
+        return {"User ID": row[0], "Time": pd.to_datetime(row[1], unit="s"),
+                "Shown": np.frombuffer(row[2], dtype=np.int32), "Labels": np.frombuffer(row[3], dtype=np.int8)}
+
+
+def store_exists():
+    return os.path.exists(store_path())